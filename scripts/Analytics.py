@@ -0,0 +1,388 @@
+"""Analytics
+
+This script loads the whole task history into a columnar snapshot for reports
+that look at every task at once: tasks per day, hour of day heatmaps, streaks
+and completion rates. It needs NumPy, which the timer app itself does not.
+
+The snapshot has one array per column, kept in the order of the task ids:
+
+* id: int64 primary key of the task
+* started: int64 start time in seconds since 1970-01-01, in the local time the
+  dates are stored in, so started // 86400 is the day of the task
+* finished: bool, True if the full 25 minutes were used
+* task: int32 code of the task name in task_names (dictionary encoding)
+* day: int32 day number of the start time, started // 86400
+* week_hour: uint8 hour of the week of the start time, 0 to 167 from Monday 0:00
+
+The start times are converted by sqlite3 while the rows are read, so no date
+string is parsed in Python, and the day and hour columns are derived from them
+once, so reports only count. Each report is one pass of np.bincount() over one
+or two columns, counting started and finished tasks together.
+
+The arrays are saved as .npy files in a directory next to the database
+("pomodoro_snapshot" for "pomodoro.db") and memory-mapped when opened, so a
+snapshot of 10 million tasks opens at once and only the pages a report reads
+are loaded.
+
+refresh() brings the snapshot up to date incrementally. Tasks with an id above
+the last id seen are appended (ids are never reused, see Schema.py). Finished
+and deleted tasks are found by comparing the snapshot with the daily summaries,
+which the database keeps up to date, and only the days that differ are read
+again. The first refresh reads the whole history, archives included.
+
+    python Analytics.py --database pomodoro.db
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError("Analytics.py needs NumPy: pip install numpy") from error
+
+#seconds in a day, the "started" column divided by it is the day number
+DAY_SECONDS = 86400
+
+#1970-01-01, day number 0, was a Thursday
+MONDAY_OFFSET = 3
+
+class HistorySnapshot():
+
+    #rows read from sqlite3 at a time
+    CHUNK_SIZE = 100000
+
+    #column name -> dtype, one .npy file each
+    COLUMNS = {"id": np.int64, "started": np.int64, "finished": np.bool_, "task": np.int32,
+               "day": np.int32, "week_hour": np.uint8}
+
+    COLUMNS_SQL = """SELECT id, CAST(strftime('%s', date) AS INTEGER), finished, task
+                     FROM {}.pomodoro WHERE id > ? ORDER BY id"""
+
+    """Open the snapshot of a TaskStore's history, saved in "directory"
+
+    Call refresh() before reading the columns, which are empty until then.
+    """
+
+    def __init__(self, store, directory = None):
+        self.store = store
+        self.directory = directory or os.path.splitext(store.database.path)[0] + "_snapshot"
+        self.last_id = 0
+        self.task_codes = {}
+        self.set_columns({name: np.empty(0, dtype) for name, dtype in HistorySnapshot.COLUMNS.items()})
+
+    def __len__(self):
+        return len(self.id)
+
+    """Return the task names, indexed by the codes of the "task" column"""
+
+    @property
+    def task_names(self):
+        return list(self.task_codes)
+
+    def set_columns(self, columns):
+        self.columns = columns
+        self.id, self.started = columns["id"], columns["started"]
+        self.finished, self.task = columns["finished"], columns["task"]
+        self.day, self.week_hour = columns["day"], columns["week_hour"]
+
+    def column_path(self, name):
+        return os.path.join(self.directory, name + ".npy")
+
+    def meta_path(self):
+        return os.path.join(self.directory, "snapshot.json")
+
+    """Bring the snapshot up to date with the database and return it
+
+    Pending writes of the store are committed first, so the snapshot includes
+    every task added, finished or deleted before the call.
+    """
+
+    def refresh(self):
+        self.store.writer.flush()
+        if not self.open():
+            self.load_all()
+            return self
+
+        new_columns = self.read_columns("main", self.last_id)
+        if len(new_columns["id"]):
+            self.append(new_columns)
+        self.reconcile()
+        return self
+
+    """Map the saved columns, returning False if there is no complete snapshot saved"""
+
+    def open(self):
+        try:
+            with open(self.meta_path(), encoding = "utf-8") as meta_file:
+                meta = json.load(meta_file)
+            columns = {name: np.load(self.column_path(name), mmap_mode = "r+") for name in HistorySnapshot.COLUMNS}
+        except (OSError, ValueError):
+            return False
+
+        rows = meta["rows"]
+        if any(len(column) < rows for column in columns.values()):
+            return False
+
+        #rows past "rows" were appended by a refresh that did not finish
+        self.set_columns({name: column[:rows] for name, column in columns.items()})
+        self.last_id = meta["last_id"]
+        self.task_codes = {name: code for code, name in enumerate(meta["task_names"])}
+        return True
+
+    """Read every task of the database and its archives and save a new snapshot"""
+
+    def load_all(self):
+        self.task_codes = {}
+        parts = []
+        for month in sorted(self.store.archives.newest_first()):
+            parts.append(self.read_columns(self.store.archives.attach(month), 0))
+        parts.append(self.read_columns("main", 0))
+
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in HistorySnapshot.COLUMNS}
+        #archived months are in id order, unless tasks were imported into them after they were archived
+        if np.any(columns["id"][1:] <= columns["id"][:-1]):
+            order = np.argsort(columns["id"], kind = "stable")
+            columns = {name: column[order] for name, column in columns.items()}
+        self.save(columns)
+
+    """Read the tasks of one schema with an id above after_id into new arrays"""
+
+    def read_columns(self, schema, after_id):
+        cursor = self.store.database.connection().execute(HistorySnapshot.COLUMNS_SQL.format(schema), (after_id,))
+        chunks = {name: [] for name in HistorySnapshot.COLUMNS}
+        code = self.task_codes.setdefault
+
+        rows = cursor.fetchmany(HistorySnapshot.CHUNK_SIZE)
+        while rows:
+            ids, started, finished, names = zip(*rows)
+            chunks["id"].append(np.array(ids, np.int64))
+            started = np.array(started, np.int64)
+            chunks["started"].append(started)
+            chunks["day"].append((started // DAY_SECONDS).astype(np.int32))
+            chunks["week_hour"].append(((started // DAY_SECONDS + MONDAY_OFFSET) % 7 * 24 + started % DAY_SECONDS // 3600).astype(np.uint8))
+            chunks["finished"].append(np.array(finished, np.bool_))
+            #a new name gets the next code, as len() is read before setdefault() adds it
+            chunks["task"].append(np.array([code(name, len(self.task_codes)) for name in names], np.int32))
+            rows = cursor.fetchmany(HistorySnapshot.CHUNK_SIZE)
+
+        return {name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype)
+                for name, dtype in HistorySnapshot.COLUMNS.items()}
+
+    """Write every column to a new file and map it
+
+    Each file is written next to the old one and then replaces it. The meta
+    file is removed first and written last, so an interrupted save leaves a
+    snapshot that is either complete or not opened at all.
+    """
+
+    def save(self, columns):
+        os.makedirs(self.directory, exist_ok = True)
+        if os.path.exists(self.meta_path()):
+            os.remove(self.meta_path())
+        #drop the maps of the old files, which can not be replaced while mapped on Windows
+        self.set_columns({name: np.empty(0, dtype) for name, dtype in HistorySnapshot.COLUMNS.items()})
+        for name, column in columns.items():
+            np.save(self.column_path(name) + ".tmp.npy", column)
+            os.replace(self.column_path(name) + ".tmp.npy", self.column_path(name))
+        self.save_meta(len(columns["id"]), int(columns["id"][-1]) if len(columns["id"]) else self.last_id)
+        self.open()
+
+    def save_meta(self, rows, last_id):
+        meta = {"rows": rows, "last_id": last_id, "task_names": self.task_names}
+        with open(self.meta_path() + ".tmp", "w", encoding = "utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(self.meta_path() + ".tmp", self.meta_path())
+
+    """Add rows at the end of every column file, without rewriting what is there
+
+    The new rows are written after the rows of the snapshot and the shape in
+    the .npy header is updated in place. NumPy pads the header so the shape can
+    grow; if it ever does not fit, the whole snapshot is saved again instead.
+    """
+
+    def append(self, new_columns):
+        rows, new_rows = len(self.id), len(new_columns["id"])
+        old_columns = self.columns
+        self.set_columns({name: np.empty(0, dtype) for name, dtype in HistorySnapshot.COLUMNS.items()})
+
+        for name, new_column in new_columns.items():
+            with open(self.column_path(name), "r+b") as column_file:
+                if np.lib.format.read_magic(column_file) != (1, 0):
+                    break
+                _, _, dtype = np.lib.format.read_array_header_1_0(column_file)
+                data_offset = column_file.tell()
+
+                header = io.BytesIO()
+                np.lib.format.write_array_header_1_0(header, {"descr": np.lib.format.dtype_to_descr(dtype),
+                                                             "fortran_order": False, "shape": (rows + new_rows,)})
+                if len(header.getvalue()) != data_offset:
+                    break
+
+                column_file.seek(data_offset + rows * dtype.itemsize)
+                column_file.write(new_column.astype(dtype).tobytes())
+                column_file.truncate()
+                column_file.seek(0)
+                column_file.write(header.getvalue())
+        else:
+            self.save_meta(rows + new_rows, int(new_columns["id"][-1]))
+            self.open()
+            return
+
+        self.save({name: np.concatenate([old_columns[name], new_columns[name]]) for name in HistorySnapshot.COLUMNS})
+
+    """Update finished flags and remove deleted tasks, on the days the summaries disagree with
+
+    The number of tasks and of finished tasks of every day in the snapshot is
+    compared with the daily summaries. The tasks of the days that differ are read
+    again with get_tasks_by_date(): a change of finished flags is written to the
+    mapped file in place, while deleted tasks make the snapshot be saved again.
+    Tasks found on those days that the snapshot does not have (imported into an
+    old day) make the whole history be read again.
+    """
+
+    def reconcile(self):
+        summary = self.store.get_daily_summary()
+        days = np.array([day for day, _, _ in summary], "datetime64[D]").astype(np.int64)
+        task_days = self.day
+        if not len(days) and not len(task_days):
+            return
+
+        first = min(days.min() if len(days) else task_days.min(), task_days.min() if len(task_days) else days.min())
+        size = max(days.max() if len(days) else 0, task_days.max() if len(task_days) else 0) - first + 1
+
+        started, finished = np.zeros(size, np.int64), np.zeros(size, np.int64)
+        started[days - first] = [day_started for _, day_started, _ in summary]
+        finished[days - first] = [day_finished for _, _, day_finished in summary]
+        snapshot_started, snapshot_finished = count_by(task_days - first, self.finished, size)
+
+        changed_days = np.flatnonzero((started != snapshot_started) | (finished != snapshot_finished)) + first
+        keep = None
+        for day in changed_days:
+            tasks = self.store.get_tasks_by_date(str(np.datetime64(int(day), "D")))
+            task_ids = np.array([task[0] for task in tasks], np.int64)
+            day_rows = np.flatnonzero(task_days == day)
+
+            if not np.isin(task_ids, self.id[day_rows]).all():
+                self.load_all()
+                return
+
+            deleted = ~np.isin(self.id[day_rows], task_ids)
+            if deleted.any():
+                keep = keep if keep is not None else np.ones(len(self.id), np.bool_)
+                keep[day_rows[deleted]] = False
+            #ids are sorted, so searchsorted() finds the row of every id
+            self.finished[np.searchsorted(self.id, task_ids)] = [task[2] for task in tasks]
+
+        if keep is not None:
+            self.save({name: column[keep] for name, column in self.columns.items()})
+        elif len(changed_days):
+            self.finished.flush()
+
+"""Return the number of tasks started and finished in each group, 0 to size - 1
+
+Both counts come from one np.bincount() over group * 2 + finished, which is
+faster than counting the finished tasks in a second pass.
+"""
+
+def count_by(groups, finished, size):
+    counts = np.bincount(groups * 2 + finished, minlength = size * 2).reshape(-1, 2)
+    return counts.sum(axis = 1), counts[:, 1]
+
+"""Return the days with tasks as datetime64[D], with the number of tasks started and finished on each"""
+
+def daily_counts(snapshot):
+    if not len(snapshot):
+        return np.empty(0, "datetime64[D]"), np.empty(0, np.int64), np.empty(0, np.int64)
+    first = snapshot.day.min()
+    started, finished = count_by(snapshot.day - first, snapshot.finished, snapshot.day.max() - first + 1)
+    active = np.flatnonzero(started)
+    return (active + first).astype("datetime64[D]"), started[active], finished[active]
+
+"""Return the number of tasks started and finished per weekday (Monday first) and hour, as two 7 x 24 arrays"""
+
+def hour_heatmap(snapshot):
+    started, finished = count_by(snapshot.week_hour.astype(np.int16), snapshot.finished, 7 * 24)
+    return started.reshape(7, 24), finished.reshape(7, 24)
+
+"""Return the longest and the current run of consecutive days with at least one finished task
+
+The result is a dict with "longest" (days), "longest_end" (the last day of the
+longest run, or None) and "current": the run ending today, or yesterday if no
+task has been finished yet today.
+"""
+
+def streaks(snapshot, today = None):
+    today = np.datetime64(today or datetime.date.today(), "D").astype(np.int64)
+    days, _, finished = daily_counts(snapshot)
+    finished_days = days[finished > 0].astype(np.int64)
+    if not len(finished_days):
+        return {"longest": 0, "longest_end": None, "current": 0}
+
+    #a run ends where the next finished day is not the day after
+    run_ends = np.flatnonzero(np.diff(finished_days) != 1)
+    run_lengths = np.diff(np.concatenate(([-1], run_ends, [len(finished_days) - 1])))
+    last_days = finished_days[np.concatenate((run_ends, [len(finished_days) - 1]))]
+    longest = run_lengths.argmax()
+
+    current = int(run_lengths[-1]) if last_days[-1] >= today - 1 else 0
+    longest_end = np.datetime64(int(last_days[longest]), "D").astype(datetime.date)
+    return {"longest": int(run_lengths[longest]), "longest_end": longest_end, "current": current}
+
+"""Return the number of tasks started and the fraction finished, grouped by "hour", "weekday" or "task"
+
+Both arrays are indexed by the group: the hour of day (0-23), the weekday
+(Monday = 0) or the code of the task name in snapshot.task_names.
+"""
+
+def completion_rates(snapshot, by = "hour"):
+    if by in ("hour", "weekday"):
+        started, finished = hour_heatmap(snapshot)
+        axis = 0 if by == "hour" else 1
+        started, finished = started.sum(axis = axis), finished.sum(axis = axis)
+    elif by == "task":
+        started, finished = count_by(snapshot.task, snapshot.finished, len(snapshot.task_codes))
+    else:
+        raise ValueError("by must be 'hour', 'weekday' or 'task', not " + repr(by))
+
+    return started, np.divide(finished, started, out = np.zeros(len(started)), where = started > 0)
+
+if __name__ == "__main__":
+
+    from Database import Database
+    from TaskStore import TaskStore
+
+    parser = argparse.ArgumentParser(description = "Refresh the history snapshot of a database and print a short report")
+    parser.add_argument("--database", default = "pomodoro.db", help = "database file")
+    args = parser.parse_args()
+
+    store = TaskStore(Database(args.database), keep_months = None)
+    start = time.perf_counter()
+    snapshot = HistorySnapshot(store).refresh()
+    print("refreshed {} tasks in {:.3f} s".format(len(snapshot), time.perf_counter() - start))
+
+    def timed(name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        print("{}: {:.1f} ms".format(name, (time.perf_counter() - start) * 1000))
+        return result
+
+    days, started, finished = timed("daily_counts", daily_counts, snapshot)
+    heatmap, _ = timed("hour_heatmap", hour_heatmap, snapshot)
+    day_streaks = timed("streaks", streaks, snapshot)
+    hour_started, hour_rates = timed("completion_rates", completion_rates, snapshot, "hour")
+
+    print()
+    for day, day_started, day_finished in list(zip(days, started, finished))[-7:]:
+        print("{}  {:5d} pomodoros  {:5d} full 25 minutes".format(day, day_started, day_finished))
+    if len(snapshot):
+        busiest_weekday, busiest_hour = np.unravel_index(heatmap.argmax(), heatmap.shape)
+        print("busiest: {} at {:02d}:00".format(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][busiest_weekday], busiest_hour))
+        print("best completion rate: {:02d}:00 ({:.0f}%)".format(hour_rates.argmax(), hour_rates.max() * 100))
+    print("streaks: longest {longest} days (until {longest_end}), current {current} days".format(**day_streaks))
+
+    store.close()
@@ -0,0 +1,191 @@
+"""Archive
+
+This script moves the tasks of old months out of the pomodoro database into one
+archive file per month, so the database used every day stays small however
+many years of history there are. The archive of December 2020 for
+"pomodoro.db" is "pomodoro_archive_2020-12.db". Archive files have the same
+schema as the database (Schema.py), including the daily summaries and the
+full-text index, and every task keeps its id.
+
+The database lists the archived months, with the range of ids each holds, in
+its "archive" table, and keeps their daily summaries in "archived_summary", so
+the list of dates and the statistics never open an archive. An archive is
+attached to the connection (ATTACH DATABASE) only when the tasks of one of its
+days are read or deleted, or a search reaches back to its month.
+"""
+
+import datetime
+import glob
+import os
+import re
+import threading
+from Database import Database
+
+class Archives():
+
+    def __init__(self, database):
+        self.database = database
+
+        #held to change or read "months", which the write queue thread changes on rollover
+        self.lock = threading.Lock()
+
+        #month ("2020-12") -> (first id, last id) of every archived month
+        archived = database.runQuery("SELECT month, first_id, last_id FROM archive", None, True)
+        self.months = {month: (first_id, last_id) for month, first_id, last_id in archived}
+
+    """Return the archive file name of a month, next to the database file"""
+
+    @staticmethod
+    def path(database_path, month):
+        name, extension = os.path.splitext(database_path)
+        return "{}_archive_{}{}".format(name, month, extension)
+
+    """Return (month, path) of every archive file that exists for a database file, oldest first"""
+
+    @staticmethod
+    def archive_paths(database_path):
+        name, extension = os.path.splitext(database_path)
+        pattern = re.compile(re.escape(name) + r"_archive_(\d{4}-\d{2})" + re.escape(extension) + "$")
+        paths = []
+        for path in glob.glob(glob.escape(name) + "_archive_*" + extension):
+            match = pattern.match(path)
+            if match:
+                paths.append((match.group(1), path))
+        return sorted(paths)
+
+    """Return the archived months, newest first"""
+
+    def newest_first(self):
+        with self.lock:
+            return sorted(self.months, reverse = True)
+
+    def is_archived(self, day):
+        with self.lock:
+            return day[:7] in self.months
+
+    """Return the schema name the archive of a month is attached as"""
+
+    @staticmethod
+    def schema(month):
+        return "archive_" + month.replace("-", "_")
+
+    """Attach the archive of a month to the calling thread's connection and return its schema name"""
+
+    def attach(self, month):
+        return self.database.attach(Archives.path(self.database.path, month), Archives.schema(month))
+
+    """Return the archived months whose range of ids covers any of task_ids, oldest first"""
+
+    def months_of(self, task_ids):
+        with self.lock:
+            ranges = sorted(self.months.items())
+        return [month for month, (first_id, last_id) in ranges
+                if any(first_id <= task_id <= last_id for task_id in task_ids)]
+
+    """Attach every archive that may hold one of task_ids, before delete() is called in a transaction
+
+    Raises ValueError if there are more of them than can be attached at once.
+    """
+
+    def attach_for_delete(self, task_ids):
+        months = self.months_of(task_ids)
+        if len(months) > Database.MAX_ATTACHED:
+            raise ValueError("Tasks of at most {} archived months can be deleted at once".format(Database.MAX_ATTACHED))
+        for month in months:
+            self.attach(month)
+        return months
+
+    """Return the first day of the months kept in the database, for example "2020-11-01" """
+
+    @staticmethod
+    def cutoff(keep_months, today = None):
+        today = today or datetime.date.today()
+        month_index = today.year * 12 + today.month - 1 - (keep_months - 1)
+        return "{:04d}-{:02d}-01".format(month_index // 12, month_index % 12 + 1)
+
+    """Move every month older than the last keep_months months (this month included) to its archive
+
+    Each month is moved in two transactions, each of which writes to one file
+    only, so it is atomic even though sqlite3 does not commit WAL databases
+    atomically together: first the tasks are copied to the archive, then they
+    are deleted from the database and the month is registered. If the app stops
+    in between, the month is still in the database and is moved again the next
+    time, skipping the tasks the archive already has by id.
+
+    Must be called outside of any transaction, on the thread that writes to the
+    database: TaskStore runs it on its write queue. Returns the months moved.
+    """
+
+    def rollover(self, keep_months, today = None):
+        cutoff = Archives.cutoff(keep_months, today)
+
+        months_sql = "SELECT DISTINCT substr(day, 1, 7) FROM daily_summary WHERE day < ? ORDER BY 1"
+        months = [month[0] for month in self.database.runQuery(months_sql, (cutoff,), True)]
+
+        for month in months:
+            self.move_month(month)
+        return months
+
+    def move_month(self, month):
+        year, month_number = int(month[:4]), int(month[5:7])
+        first_day = month + "-01"
+        next_month = "{:04d}-{:02d}-01".format(year + month_number // 12, month_number % 12 + 1)
+
+        path = Archives.path(self.database.path, month)
+        if not os.path.exists(path):
+            archive = Database(path)
+            archive.migrate()
+            archive.close()
+        schema = self.attach(month)
+
+        with self.database.transaction() as conn:
+            conn.execute("""INSERT INTO {0}.pomodoro (id, task, finished, date, day)
+                            SELECT id, task, finished, date, day FROM main.pomodoro AS hot
+                            WHERE day >= ? AND day < ? AND NOT EXISTS (
+                                SELECT 1 FROM {0}.pomodoro AS archived WHERE archived.id = hot.id)
+                            ORDER BY id""".format(schema), (first_day, next_month))
+
+        with self.database.transaction() as conn:
+            first_id, last_id = conn.execute("SELECT min(id), max(id) FROM {}.pomodoro".format(schema)).fetchone()
+            conn.execute("""INSERT INTO main.archive (month, first_id, last_id) VALUES (?, ?, ?)
+                            ON CONFLICT (month) DO UPDATE SET first_id = excluded.first_id, last_id = excluded.last_id""",
+                         (month, first_id, last_id))
+            conn.execute("""INSERT OR REPLACE INTO main.archived_summary (day, started, finished)
+                            SELECT day, started, finished FROM {}.daily_summary WHERE day >= ? AND day < ?""".format(schema),
+                         (first_day, next_month))
+            conn.execute("DELETE FROM main.pomodoro WHERE day >= ? AND day < ?", (first_day, next_month))
+
+        with self.lock:
+            self.months[month] = (first_id, last_id)
+
+    """Delete tasks by id from the archives holding them and return the (id, task, finished, date) of those deleted
+
+    Called by TaskStore.delete_tasks() on the write queue thread, with "conn"
+    inside its transaction, once attach_for_delete() has attached the archives:
+    only those whose range of ids covers an id are looked at. The tasks are
+    deleted through the attached schemas and the summaries of their days are
+    updated in the same transaction, so one commit covers the database and
+    every archive file.
+    """
+
+    def delete(self, conn, task_ids):
+        deleted = []
+        with self.lock:
+            ranges = sorted(self.months.items())
+
+        for month, (first_id, last_id) in ranges:
+            month_ids = [task_id for task_id in task_ids if first_id <= task_id <= last_id]
+            if not month_ids:
+                continue
+
+            schema = Archives.schema(month)
+            placeholders = ", ".join("?" * len(month_ids))
+            month_deleted = conn.execute("SELECT id, task, finished, date FROM {}.pomodoro WHERE id IN ({})".format(schema, placeholders), month_ids).fetchall()
+            conn.execute("DELETE FROM {}.pomodoro WHERE id IN ({})".format(schema, placeholders), month_ids)
+
+            for day in set(date[:10] for _, _, _, date in month_deleted):
+                conn.execute("DELETE FROM main.archived_summary WHERE day = ?", (day,))
+                conn.execute("""INSERT INTO main.archived_summary (day, started, finished)
+                                SELECT day, started, finished FROM {}.daily_summary WHERE day = ?""".format(schema), (day,))
+            deleted += month_deleted
+        return deleted
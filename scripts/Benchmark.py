@@ -0,0 +1,230 @@
+"""Benchmark
+
+This script times the hot paths of the Pomodoro timer app on generated sample
+databases of increasing size:
+
+* Database.runQuery and the TaskStore methods get_unique_dates(),
+  get_tasks_by_date(), task_is_duplicate(), search_tasks() and delete_task(),
+  with the hits, misses and evictions of the store's day cache over the run
+* LogWindow construction (needs a display, for example Xvfb, otherwise skipped)
+* CountingThread CPU usage and tick jitter
+* TimerScheduler jitter
+* cold-start import time of the GUI and of the headless core, from python -X importtime
+
+Results are written as JSON. When a baseline JSON file from an earlier run is
+given, every timing is compared to it and the script exits with status 1 if any
+of them got slower by more than the tolerance. For example:
+
+    python Benchmark.py --output results.json
+    python Benchmark.py --baseline results.json --tolerance 0.25
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from Database import Database
+from TaskStore import TaskStore
+from CountingThread import CountingThread
+from GenerateSampleDatabase import SampleDatabase
+import TimerScheduler
+
+#metrics compared against the baseline. Lower is better for all of them.
+COMPARED_METRICS = ("median_ms", "jitter_ms_p99", "cpu_seconds")
+
+"""Run function repeat times and return the median and max time in milliseconds"""
+
+def time_calls(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(timings), 4), "max_ms": round(max(timings), 4), "calls": repeat}
+
+def benchmark_database(rows, directory, repeat):
+    path = os.path.join(directory, "pomodoro_{}.db".format(rows))
+    generate_start = time.perf_counter()
+    sample = SampleDatabase(path)
+    sample.createData(rows = rows, days = max(1, rows // 100), seed = 1)
+    sample.database.close()
+    generate_seconds = time.perf_counter() - generate_start
+
+    #the sample data is years old, so it is not archived, to time the same paths at every size
+    store = TaskStore(Database(path), keep_months = None)
+    dates = [date[0] for date in store.get_unique_dates()]
+    middle_day = dates[len(dates) // 2]
+    day_tasks = store.get_tasks_by_date(middle_day)
+
+    results = {
+        "generate": {"seconds": round(generate_seconds, 3), "rows": rows},
+        "runQuery": time_calls(lambda: store.database.runQuery("SELECT count(*) FROM pomodoro WHERE day = ?", (middle_day,), True), repeat),
+        "get_unique_dates": time_calls(store.get_unique_dates, repeat),
+        "get_tasks_by_date": time_calls(lambda: store.get_tasks_by_date(middle_day), repeat),
+        "get_tasks_by_date_page": time_calls(lambda: store.get_tasks_by_date(middle_day, None, 100), repeat),
+        "task_is_duplicate": time_calls(lambda: store.task_is_duplicate("Sample Task 1", datetime.date.fromisoformat(middle_day)), repeat),
+        "search_tasks": time_calls(lambda: store.search_tasks("sam ta", None, 100), repeat),
+    }
+
+    #every call deletes a different task, and waits until the delete is committed
+    to_delete = iter([(task[1], task[3][:16]) for task in day_tasks])
+    results["delete_task"] = time_calls(lambda: store.delete_task(*next(to_delete)).result(), min(repeat, len(day_tasks)))
+
+    results["LogWindow"] = benchmark_log_window(store, repeat)
+    results["day_cache"] = store.cache_stats()
+
+    store.close()
+    return results
+
+"""Time LogWindow construction, including the load of the first tab"""
+
+def benchmark_log_window(store, repeat):
+    import tkinter as tk
+    from LogWindow import LogWindow
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        return {"skipped": "no display: " + str(error)}
+
+    root.withdraw()
+
+    def build():
+        window = LogWindow(root, store)
+        root.update()
+        window.destroy()
+
+    results = time_calls(build, max(1, repeat // 10))
+    root.destroy()
+    return results
+
+"""Run a CountingThread for a few seconds and measure CPU usage and tick jitter
+
+Jitter is how long after the whole-second boundary of the countdown the
+update_time_remaining() call arrives.
+"""
+
+class _RecordingMaster():
+    def __init__(self):
+        self.updates = []
+        self.finished = threading.Event()
+
+    def update_time_remaining(self, time_string):
+        self.updates.append(datetime.datetime.now())
+
+    def finish(self):
+        self.finished.set()
+
+def benchmark_counting_thread(seconds):
+    master = _RecordingMaster()
+    now = datetime.datetime.now()
+    end_time = now + datetime.timedelta(seconds = seconds)
+    master.worker = CountingThread(master, now, end_time)
+
+    cpu_start = time.process_time()
+    master.worker.start()
+    master.finished.wait()
+    cpu_used = time.process_time() - cpu_start
+
+    #the first update is shown right away, the others are due when (end_time - now) drops by a whole second
+    jitter = []
+    for update in master.updates[1:]:
+        remaining = (end_time - update).total_seconds()
+        jitter.append((math.ceil(remaining) - remaining) * 1000)
+    jitter.sort()
+
+    return {
+        "updates": len(master.updates),
+        "cpu_seconds": round(cpu_used, 4),
+        "cpu_percent": round(cpu_used / seconds * 100, 3),
+        "jitter_ms_median": round(statistics.median(jitter), 3) if jitter else 0,
+        "jitter_ms_p99": round(jitter[int(len(jitter) * 0.99)], 3) if jitter else 0,
+    }
+
+"""Measure the cold-start import time of a module with python -X importtime
+
+The cumulative import time, in milliseconds, is taken from the line reported
+for the module itself, and the median of "repeat" fresh interpreters is kept.
+"""
+
+def benchmark_import_time(module, repeat = 5):
+    scripts_directory = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                                 cwd = scripts_directory, capture_output = True, text = True, check = True)
+        for line in process.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == module:
+                timings.append(int(fields[1]) / 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "runs": repeat}
+
+"""Compare results to a baseline and return a list of regressions"""
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results["benchmarks"].items():
+        for metric in COMPARED_METRICS:
+            old = baseline.get("benchmarks", {}).get(name, {}).get(metric)
+            new = metrics.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append({"benchmark": name, "metric": metric, "baseline": old, "current": new,
+                                    "change": round(new / old - 1, 3)})
+    return regressions
+
+def run(sizes, repeat, counting_seconds):
+    benchmarks = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            for name, metrics in benchmark_database(rows, directory, repeat).items():
+                benchmarks["{}[{}]".format(name, rows)] = metrics
+
+    benchmarks["CountingThread"] = benchmark_counting_thread(counting_seconds)
+    for timer_count in (10, 1000):
+        benchmarks["TimerScheduler[{}]".format(timer_count)] = TimerScheduler.benchmark(timer_count, 2)
+    for module in ("PomodoroTimer", "PomodoroSession", "TaskStore"):
+        benchmarks["import[{}]".format(module)] = benchmark_import_time(module)
+
+    return {
+        "created": datetime.datetime.now().isoformat(" ", "seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "benchmarks": benchmarks,
+    }
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmark the Pomodoro timer app")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 10000, 100000], help = "database sizes in rows")
+    parser.add_argument("--repeat", type = int, default = 50, help = "calls per timed method")
+    parser.add_argument("--counting-seconds", type = int, default = 5, help = "length of the CountingThread run")
+    parser.add_argument("--output", help = "write results to this JSON file instead of standard output")
+    parser.add_argument("--baseline", help = "JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.25, help = "allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.counting_seconds)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            results["regressions"] = compare(results, json.load(baseline_file), args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent = 2)
+    else:
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+
+    if results.get("regressions"):
+        sys.exit(1)
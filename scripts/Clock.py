@@ -0,0 +1,152 @@
+"""Clock
+
+This script provides the clocks the countdown reads the time from and sleeps
+on. CountingThread and PomodoroSession take a clock object with the following
+methods:
+
+* now(): the current time as a datetime
+* wait(condition, timeout): like condition.wait(timeout), called with the lock
+  of the condition held
+* notify(condition): like condition.notify(), wakes a thread waiting on the
+  condition through wait()
+* add_thread() and remove_thread(): called when a thread that waits on the
+  clock starts and ends
+
+SystemClock is the real time and is used by the app. SimulatedClock is a
+virtual time for tests and load scenarios (see Simulation.py): it only moves
+when every thread taking part is waiting on it, and then jumps straight to the
+earliest deadline, so a 25 minute countdown takes as long as the code it runs.
+"""
+
+import datetime
+import threading
+import time
+
+class SystemClock():
+
+    #CountingThread wakes up every second to show the time remaining
+    ticks = True
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def wait(self, condition, timeout = None):
+        condition.wait(timeout)
+
+    def notify(self, condition):
+        condition.notify()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def add_thread(self):
+        pass
+
+    def remove_thread(self):
+        pass
+
+class SimulatedWaiter():
+    """A thread waiting on a SimulatedClock until "deadline" (None for no timeout) or a notify"""
+
+    __slots__ = ("deadline", "condition", "event")
+
+    def __init__(self, deadline, condition):
+        self.deadline = deadline
+        self.condition = condition
+        self.event = threading.Event()
+
+class SimulatedClock():
+
+    """Start a virtual time at "start", by default today at 9:00
+
+    Every thread that waits on the clock must be counted with add_thread()
+    before it starts and remove_thread() when it ends, including the thread
+    running the scenario. The time moves only when all of them are waiting.
+
+    With ticks = False, the default, CountingThread does not wake up every
+    second to show the time remaining, only when its countdown ends or its
+    state changes. The database rows are the same either way.
+    """
+
+    def __init__(self, start = None, ticks = False):
+        self.current = start or datetime.datetime.combine(datetime.date.today(), datetime.time(9))
+        self.ticks = ticks
+        self.lock = threading.Lock()
+
+        #threads counted with add_thread() that are not waiting, and the waiting ones
+        self.running = 0
+        self.waiters = []
+
+    def now(self):
+        with self.lock:
+            return self.current
+
+    def add_thread(self):
+        with self.lock:
+            self.running += 1
+
+    def remove_thread(self):
+        with self.lock:
+            self.running -= 1
+            self.advance()
+
+    """Wait until the virtual time reaches now + timeout or the condition is notified through notify()
+
+    The lock of the condition is released while waiting, as by condition.wait().
+    If this was the last thread running and no thread waits with a timeout, the
+    time could never move again, so RuntimeError is raised.
+    """
+
+    def wait(self, condition, timeout = None):
+        with self.lock:
+            deadline = self.current + datetime.timedelta(seconds = timeout) if timeout is not None else None
+            waiter = SimulatedWaiter(deadline, condition)
+            self.waiters.append(waiter)
+            self.running -= 1
+            if not self.advance():
+                self.waiters.remove(waiter)
+                self.running += 1
+                raise RuntimeError("Every thread of the simulation waits without a timeout")
+
+        condition.release()
+        try:
+            waiter.event.wait()
+        finally:
+            condition.acquire()
+
+    def notify(self, condition):
+        with self.lock:
+            for waiter in self.waiters:
+                if waiter.condition is condition:
+                    self.wake(waiter)
+                    return
+
+    def sleep(self, seconds):
+        condition = threading.Condition()
+        with condition:
+            self.wait(condition, seconds)
+
+    def wake(self, waiter):
+        self.waiters.remove(waiter)
+        self.running += 1
+        waiter.event.set()
+
+    """Move the time to the earliest deadline and wake its waiters, if no thread is running
+
+    Called with the lock held. Returns False if no thread is running and none
+    has a deadline.
+    """
+
+    def advance(self):
+        if self.running > 0 or not self.waiters:
+            return True
+
+        deadlines = [waiter.deadline for waiter in self.waiters if waiter.deadline is not None]
+        if not deadlines:
+            return False
+
+        self.current = max(self.current, min(deadlines))
+        for waiter in list(self.waiters):
+            if waiter.deadline is not None and waiter.deadline <= self.current:
+                self.wake(waiter)
+        return True
@@ -1,57 +1,160 @@
-"""Counting Thread
-
-This script creates a seperate thread to count down a specific amount of time.
-This scripts depends on instantiating class (master) to provide method implementation
-for finish() and update_time_remaining() methods.
-
-Laste edited: 2020-12-24
-"""
-
-import threading
-import datetime
-
-class CountingThread(threading.Thread):
-
-    def __init__(self, master, start_time, end_time):
-        super().__init__()
-        self.master = master
-        self.start_time = start_time
-        self.end_time = end_time
-
-        self.end_now = False
-        self.paused = False
-        self.force_quit = False
-
-    def run(self):
-        """Continously run main loop until count down timer is paused, time ends or force stops.
-
-        If timer is paused, the while loops without performing any operation.
-        If count down time ends/completes, the finish method, to be implmented by the class initiator, is called.
-        If count down is force quit, this thread object is deleted.
-        """
-
-        while True:
-            if not self.paused and not self.end_now and not self.force_quit:
-                self.main_loop()
-                if datetime.datetime.now() >= self.end_time:
-                    if not self.force_quit:
-                        self.master.finish()
-                        break
-            elif self.end_now:
-                self.master.finish()
-                break
-            elif self.force_quit:
-                del self.master.worker
-                return
-            else:
-                continue
-        return
-
-    def main_loop(self):
-        now = datetime.datetime.now()
-        if now < self.end_time:
-            time_difference = self.end_time - now
-            mins, secs = divmod(time_difference.seconds, 60)    #returns tuple
-            time_string = "{:02d}:{:02d}".format(mins, secs)
-            if not self.force_quit:
-                self.master.update_time_remaining(time_string)
+"""Counting Thread
+
+This script creates a seperate thread to count down a specific amount of time.
+This scripts depends on instantiating class (master) to provide method implementation
+for finish() and update_time_remaining() methods.
+
+The thread does not poll. It sleeps until the displayed time is due to change
+(the next whole second of the countdown) or until pause(), resume(), finish_now()
+or stop() wakes it up.
+
+The time is read from and slept on a clock object (see Clock.py), the real time
+by default. With a SimulatedClock, a countdown runs in virtual time.
+
+Laste edited: 2020-12-24
+"""
+
+import threading
+import time
+import Metrics
+from Clock import SystemClock
+
+class CountingThread(threading.Thread):
+
+    def __init__(self, master, start_time, end_time, clock = None):
+        super().__init__()
+        self.master = master
+        self.start_time = start_time
+        self.end_time = end_time
+        self.clock = clock or SystemClock()
+
+        self.end_now = False
+        self.paused = False
+        self.force_quit = False
+
+        #wakes the thread up whenever any of the state flags above change
+        self.wakeup = threading.Condition()
+        self.last_time_string = None
+
+    def run(self):
+        """Sleep until the next tick, time ends, or the state of the thread changes.
+
+        If timer is paused, the thread waits without a timeout until it is resumed.
+        If count down time ends/completes, the finish method, to be implmented by the class initiator, is called.
+        If count down is force quit, this thread object is deleted.
+
+        master is never called while holding the wakeup lock so the GUI can
+        always pause/resume/finish without blocking on this thread.
+
+        The CPU time used by the thread is added to Metrics when it ends.
+        """
+
+        try:
+            self.count_down()
+        finally:
+            self.clock.remove_thread()
+            if Metrics.enabled:
+                Metrics.increment("counting_thread_cpu_seconds_total", time.thread_time())
+
+    def start(self):
+        self.clock.add_thread()
+        super().start()
+
+    def count_down(self):
+        while True:
+            with self.wakeup:
+                if self.force_quit:
+                    break
+                if self.paused and not self.end_now:
+                    self.clock.wait(self.wakeup)
+                    continue
+                now = self.clock.now()
+                finished = self.end_now or now >= self.end_time
+                end_time = self.end_time
+
+            if finished:
+                self.master.finish()
+                return
+
+            self.main_loop(now, end_time)
+
+            with self.wakeup:
+                if not (self.paused or self.end_now or self.force_quit):
+                    self.clock.wait(self.wakeup, self.seconds_until_next_wakeup(self.clock.now(), self.end_time))
+
+        del self.master.worker
+
+    def main_loop(self, now, end_time):
+        """Push the remaining time to master only when the displayed value changes"""
+
+        time_difference = end_time - now
+        mins, secs = divmod(time_difference.seconds, 60)    #returns tuple
+        time_string = "{:02d}:{:02d}".format(mins, secs)
+        if time_string != self.last_time_string and not self.force_quit:
+            if Metrics.enabled:
+                self.record_tick(time_difference)
+            self.last_time_string = time_string
+            self.master.update_time_remaining(time_string)
+
+    def record_tick(self, time_difference):
+        """Count the tick and how long after its whole second of the countdown it came.
+
+        The first value is pushed right away rather than on a whole second, so
+        its lateness is not recorded.
+        """
+
+        Metrics.increment("counting_thread_ticks_total")
+        if self.last_time_string is not None:
+            #a tick landing exactly on the whole second (no microseconds) is 0 late, not 1
+            Metrics.observe("counting_thread_tick_lateness_seconds", (1 - time_difference.microseconds / 1000000) % 1)
+
+    def seconds_until_next_wakeup(self, now, end_time):
+        """Seconds until the next tick, or until the end if the clock does not tick"""
+
+        if self.clock.ticks:
+            return self.seconds_until_next_tick(now, end_time)
+        return max((end_time - now).total_seconds(), 0)
+
+    @staticmethod
+    def seconds_until_next_tick(now, end_time):
+        """Seconds until the whole-second count of (end_time - now) drops by one.
+
+        A millisecond is added so the thread wakes just after the boundary
+        rather than just before it.
+        """
+
+        if now >= end_time:
+            return 0
+        fraction = (end_time - now).microseconds / 1000000
+        return (fraction or 1) + 0.001
+
+    """Thread-safe state changes used by the instantiating class (master)
+
+    Each method changes the state flags under the wakeup lock and wakes the
+    thread so the change takes effect immediately instead of on the next tick.
+
+    The whole paused time, fractions of a second included, is added to the end
+    time on resume.
+    """
+
+    def pause(self):
+        with self.wakeup:
+            self.paused = True
+            self.start_time = self.clock.now()
+            self.clock.notify(self.wakeup)
+
+    def resume(self):
+        with self.wakeup:
+            self.end_time = self.end_time + (self.clock.now() - self.start_time)
+            self.paused = False
+            self.clock.notify(self.wakeup)
+
+    def finish_now(self):
+        with self.wakeup:
+            self.end_now = True
+            self.clock.notify(self.wakeup)
+
+    def stop(self):
+        with self.wakeup:
+            self.force_quit = True
+            self.clock.notify(self.wakeup)
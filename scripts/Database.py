@@ -0,0 +1,164 @@
+"""Database
+
+This script provides the sqlite3 data access shared by the Pomodoro timer app
+and the sample database script. Instead of opening a new connection for every
+query, each thread keeps one long-lived connection to the database file.
+
+Every connection is opened in WAL journal mode, so the log window can read
+while the timer writes, and keeps a cache of prepared statements so repeated
+queries are not parsed again. Every connection also has the sql function
+normalize_task_name(), the form task names are compared in for duplicates (see
+TaskNameIndex.py).
+"""
+
+import sqlite3
+import threading
+import contextlib
+import collections
+import time
+import Schema
+import Metrics
+from TaskNameIndex import normalize
+
+class Database():
+
+    #pragmas applied to every new connection
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -16000",
+        "PRAGMA busy_timeout = 5000",
+    )
+
+    #sql functions added to every new connection: (name, number of arguments, function)
+    FUNCTIONS = (
+        ("normalize_task_name", 1, normalize),
+    )
+
+    #number of prepared statements kept by each connection
+    CACHED_STATEMENTS = 256
+
+    #databases attached to a connection at a time, below sqlite3's default limit of 10
+    MAX_ATTACHED = 8
+
+    def __init__(self, path = "pomodoro.db"):
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    """Return the calling thread's connection and open it on first use
+
+    isolation_level = None leaves the connection in autocommit mode, so a single
+    write is committed right away and transaction() is used to group writes.
+    """
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level = None, check_same_thread = False,
+                                   cached_statements = Database.CACHED_STATEMENTS)
+            for pragma in Database.PRAGMAS:
+                conn.execute(pragma)
+            for name, arguments, function in Database.FUNCTIONS:
+                conn.create_function(name, arguments, function, deterministic = True)
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    """Run sql query on the calling thread's connection
+
+    The method has three arguments. The "sql" parameter is the sql query in string.
+    the "data" paramter holds the values of a prepared statement. By default, it is
+    set to None. The third parameter "receive" tells the method if there's a return
+    for the sql query.
+
+    The time taken, including fetching the rows, is recorded in Metrics when
+    instrumentation is enabled.
+    """
+
+    def runQuery(self, sql, data = None, receive = False):
+        start = time.perf_counter() if Metrics.enabled else None
+        cursor = self.connection().execute(sql, data or ())
+        rows = cursor.fetchall() if receive else None
+        if start is not None:
+            Metrics.observe("database_query_seconds", time.perf_counter() - start)
+        return rows
+
+    """Run sql query and yield its rows, fetched from sqlite3 in chunks of chunk_size"""
+
+    def streamQuery(self, sql, data = None, chunk_size = 1000):
+        cursor = self.connection().execute(sql, data or ())
+        rows = cursor.fetchmany(chunk_size)
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(chunk_size)
+
+    """Run a prepared statement once for every item in rows inside one transaction"""
+
+    def runMany(self, sql, rows):
+        with self.transaction() as conn:
+            conn.executemany(sql, rows)
+
+    """Run the statements of a with block in one transaction on this thread's connection
+
+    The transaction is rolled back if the block raises or if COMMIT itself
+    fails (for example with "database is locked"), so the connection is never
+    left inside an open transaction.
+    """
+
+    @contextlib.contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            #a failed COMMIT may already have ended the transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    """Create the tables or upgrade them to the latest schema version in Schema.py"""
+
+    def migrate(self):
+        with self.transaction() as conn:
+            Schema.upgrade(conn)
+
+    """Attach another database file to the calling thread's connection as "alias"
+
+    Tables of the attached file are then read as "alias.table", in the same
+    queries as the tables of this database. Each connection keeps at most
+    MAX_ATTACHED files attached and detaches the one used the longest time ago
+    to make room. sqlite3 does not allow attaching or detaching inside a
+    transaction, so this must be called outside of transaction().
+    """
+
+    def attach(self, path, alias):
+        conn = self.connection()
+        attached = getattr(self.local, "attached", None)
+        if attached is None:
+            attached = self.local.attached = collections.OrderedDict()
+
+        if alias in attached:
+            attached.move_to_end(alias)
+            return alias
+
+        while len(attached) >= Database.MAX_ATTACHED:
+            oldest_alias, _ = attached.popitem(last = False)
+            conn.execute("DETACH DATABASE " + oldest_alias)
+        conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        attached[alias] = path
+        return alias
+
+    """Close every connection opened by this object, from any thread"""
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
@@ -1,71 +1,128 @@
-"""Generate Sample Database for Pomodoro Timer App
-
-This script creates sample sqlite3 data for demostration and testing of the
-pomodoro timer app. By default, the sqlite3 database file generated will be named
-"pomodoro.db". It will check if a local database file of the same name exists
-and this script will backup the existing database file and rename with the date
-of backup (for example:"pomodoro.db" -> "pomodoro_backup(12-29-2020).db")
-
-By default, no changes in the PomodoroTimer.py code will need to be modified
-to connect to this database in runQuery().
-
-Laste edited: 2020-12-29
-"""
-
-import sqlite3
-import random
-import datetime
-import os
-
-class SampleDatabase():
-    def __init__(self):
-        create_tables="CREATE TABLE pomodoro (task text, finished integer, date text)"
-        SampleDatabase.runQuery(create_tables)
-
-    def createData(self):
-        task_sql = "INSERT INTO pomodoro VALUES (?, ?, ?)"
-        sampleDate = [23, 24, 25]
-        for sampledate in sampleDate:
-            currentDate = datetime.datetime(2020,12,sampledate, 8, 30, 0, 342380)
-            for x in range(1,11):
-                task_text = "Sample Task " + str(x)
-                finished_int = random.randint(0, 1)
-                data = (task_text, finished_int, currentDate)
-                self.runQuery(task_sql, data)
-                currentDate = currentDate + datetime.timedelta(hours = 1)
-
-    def viewDB(self):
-        results = self.runQuery("SELECT * FROM pomodoro", None, True)
-        for line in results:
-            print(line)
-
-    @staticmethod
-    def runQuery(sql, data = None, receive = False):
-        conn  =  sqlite3.connect("pomodoro.db")
-        cursor  =  conn.cursor()
-
-        if data:
-            cursor.execute(sql, data)
-        else:
-            cursor.execute(sql)
-
-        if receive:
-            return cursor.fetchall()
-        else:
-            conn.commit()
-
-        conn.close()
-        
-if __name__ == "__main__":
-
-    """if "pomodoro.db" already exists, back it up by by renaming it with backup date extension"""
-
-    if os.path.isfile("pomodoro.db"):
-        backup_file_name = "pomodoro_backup(" + datetime.datetime.now().strftime("%m-%d-%Y") + ").db"
-        os.rename(os.path.join(os.getcwd(), "pomodoro.db"), os.path.join(os.getcwd(), backup_file_name))
-
-    #Method used for viewing database during debugging
-    #sample.viewDB()
-
-    sample = SampleDatabase()
-    sample.createData()
+"""Generate Sample Database for Pomodoro Timer App
+
+This script creates sample sqlite3 data for demostration and testing of the
+pomodoro timer app. By default, the sqlite3 database file generated will be named
+"pomodoro.db". It will check if a local database file of the same name exists
+and this script will backup the existing database file and rename with the date
+of backup (for example:"pomodoro.db" -> "pomodoro_backup(12-29-2020).db"). Its
+monthly archive files are renamed with it, so the backup keeps its whole
+history and the new database does not pick up the old archives.
+
+By default, no changes in the PomodoroTimer.py code will need to be modified
+to connect to this database in runQuery(). All queries go through the shared
+Database object in Database.py.
+
+The amount and shape of the data can be changed from the command line, which
+makes the script usable for generating large databases for load testing. The
+same --seed always generates the same rows. For example, 10 million tasks over
+two years:
+
+    python GenerateSampleDatabase.py --rows 10000000 --days 730 --seed 1
+
+Laste edited: 2020-12-29
+"""
+
+import argparse
+import itertools
+import random
+import datetime
+import os
+from Database import Database
+from Archive import Archives
+
+class SampleDatabase():
+
+    #number of rows inserted per transaction
+    CHUNK_SIZE = 100000
+
+    def __init__(self, path = "pomodoro.db"):
+        self.database = Database(path)
+        self.database.migrate()
+
+    """Generate sample tasks and bulk insert them
+
+    "rows" tasks are spread evenly over "days" consecutive days starting from
+    first_day. Tasks of a day start at 8:30 and are one hour apart, or closer
+    together if a day holds too many tasks to fit before midnight. Task names
+    cycle through "Sample Task 1" to "Sample Task <tasks>" and a task is finished
+    with a probability of finished_ratio.
+
+    Rows come from a generator and are written with executemany() in chunks of
+    CHUNK_SIZE, one transaction per chunk, so memory stays constant no matter
+    how many rows are generated.
+    """
+
+    def createData(self, rows = 30, days = 3, tasks = 10, finished_ratio = 0.5, seed = None,
+                   first_day = datetime.date(2020, 12, 23)):
+        task_sql = "INSERT INTO pomodoro (task, finished, date, day) VALUES (?, ?, ?, ?)"
+        rows_left = self.generateRows(rows, days, tasks, finished_ratio, seed, first_day)
+
+        #a sample database can be regenerated, so it is written without journal or fsync
+        conn = self.database.connection()
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        try:
+            while True:
+                chunk = list(itertools.islice(rows_left, SampleDatabase.CHUNK_SIZE))
+                if not chunk:
+                    break
+                self.database.runMany(task_sql, chunk)
+        finally:
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+
+    @staticmethod
+    def generateRows(rows, days, tasks, finished_ratio, seed, first_day):
+        rng = random.Random(seed)
+        rows_per_day = -(-rows // days)     #ceiling division
+
+        """Names and times repeat every day, so they are formatted only once"""
+
+        day_start = datetime.datetime.combine(first_day, datetime.time(8, 30, 0, 342380))
+        seconds_to_midnight = (datetime.datetime.combine(first_day, datetime.time.max) - day_start).total_seconds()
+        spacing = datetime.timedelta(seconds = min(3600, seconds_to_midnight / rows_per_day))
+
+        task_names = ["Sample Task " + str(x % tasks + 1) for x in range(rows_per_day)]
+        task_times = [(day_start + spacing * x).time().isoformat("microseconds") for x in range(rows_per_day)]
+
+        for day_number in range(days):
+            day = (first_day + datetime.timedelta(days = day_number)).isoformat()
+            for x in range(min(rows_per_day, rows - day_number * rows_per_day)):
+                finished_int = 1 if rng.random() < finished_ratio else 0
+                yield (task_names[x], finished_int, day + " " + task_times[x], day)
+
+    def viewDB(self):
+        results = self.runQuery("SELECT * FROM pomodoro", None, True)
+        for line in results:
+            print(line)
+
+    def runQuery(self, sql, data = None, receive = False):
+        return self.database.runQuery(sql, data, receive)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Generate a sample database for the Pomodoro timer app")
+    parser.add_argument("--output", default = "pomodoro.db", help = "database file to create")
+    parser.add_argument("--rows", type = int, default = 30, help = "number of tasks to generate")
+    parser.add_argument("--days", type = int, default = 3, help = "number of days the tasks are spread over")
+    parser.add_argument("--tasks", type = int, default = 10, help = "number of distinct task names")
+    parser.add_argument("--finished-ratio", type = float, default = 0.5, help = "fraction of tasks that ran the full 25 minutes")
+    parser.add_argument("--seed", type = int, default = None, help = "random seed, for reproducible output")
+    args = parser.parse_args()
+
+    """if the database file already exists, back it up by by renaming it with backup date extension"""
+
+    if os.path.isfile(args.output):
+        name, extension = os.path.splitext(args.output)
+        backup_file_name = name + "_backup(" + datetime.datetime.now().strftime("%m-%d-%Y") + ")" + extension
+        for month, archive_path in Archives.archive_paths(args.output):
+            os.rename(archive_path, Archives.path(backup_file_name, month))
+        os.rename(args.output, backup_file_name)
+
+    sample = SampleDatabase(args.output)
+    sample.createData(args.rows, args.days, args.tasks, args.finished_ratio, args.seed)
+
+    #Method used for viewing database during debugging
+    #sample.viewDB()
+
+    sample.database.close()
@@ -0,0 +1,213 @@
+"""Load Generator
+
+This script puts PomodoroService.py under load: it starts many sessions at once
+and subscribes to the countdown of every one of them, then reports how the
+service kept up. By default it starts the service itself, on a new temporary
+database, in a separate process:
+
+    python LoadGenerator.py --sessions 5000 --duration 20
+
+or it can load a service that is already running:
+
+    python LoadGenerator.py --url http://127.0.0.1:8765
+    python LoadGenerator.py --unix /tmp/pomodoro.sock
+
+The sessions are spread over --connections client connections, each starting
+its share of sessions one after the other (keep-alive) and then following all
+of them on one event stream. The report gives the start request latency, the
+number of countdown updates received against the number expected, the delay
+between an update being sent and received, and the CPU time the service
+process used over the run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+"""Raise the limit of open files to its maximum, as every connection is a file descriptor"""
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+class Client():
+    """One HTTP/1.1 keep-alive connection to the service"""
+
+    def __init__(self, host, port, unix_path):
+        self.host, self.port, self.unix_path = host, port, unix_path
+
+    async def connect(self):
+        if self.unix_path:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path, limit = 1 << 20)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit = 1 << 20)
+
+    async def request(self, method, path, payload = None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n".format(method, path, len(body)).encode() + body)
+        status = int((await self.reader.readline()).split()[1])
+        headers = await self.read_headers()
+        data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, json.loads(data)
+
+    async def read_headers(self):
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if not line.strip():
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    """Follow an event stream until every session in it has finished, calling on_event(name, data)"""
+
+    async def follow(self, path, on_event):
+        self.writer.write("GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(path).encode())
+        status = int((await self.reader.readline()).split()[1])
+        await self.read_headers()
+        if status != 200:
+            return
+        event = None
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            if line.startswith(b"event: "):
+                event = line[7:].strip().decode()
+            elif line.startswith(b"data: "):
+                on_event(event, json.loads(line[6:]))
+
+    def close(self):
+        self.writer.close()
+
+class Load():
+
+    def __init__(self, args, host, port, unix_path):
+        self.args = args
+        self.host, self.port, self.unix_path = host, port, unix_path
+        self.start_latencies = []
+        self.start_errors = 0
+        self.ticks = 0
+        self.finished = 0
+        self.delivery_delays = []
+
+    async def request(self, method, path):
+        client = Client(self.host, self.port, self.unix_path)
+        await client.connect()
+        try:
+            return await client.request(method, path)
+        finally:
+            client.close()
+
+    async def run_connection(self, connection_number, session_count):
+        client = Client(self.host, self.port, self.unix_path)
+        await client.connect()
+        session_ids = []
+        for number in range(session_count):
+            task = "Load {} {} {}".format(self.args.run_name, connection_number, number)
+            start = time.perf_counter()
+            status, session = await client.request("POST", "/sessions", {"task": task, "duration": self.args.duration})
+            self.start_latencies.append(time.perf_counter() - start)
+            if status == 201:
+                session_ids.append(str(session["id"]))
+            else:
+                self.start_errors += 1
+
+        def on_event(event, data):
+            if event == "finished":
+                self.finished += 1
+            else:
+                self.ticks += 1
+                #one delay in a hundred is kept, enough for the percentiles
+                if self.ticks % 100 == 0:
+                    self.delivery_delays.append(time.time() - data["sent"])
+
+        if session_ids:
+            await client.follow("/events?ids=" + urllib.parse.quote(",".join(session_ids)), on_event)
+        client.close()
+
+    async def run(self):
+        _, stats_before = await self.request("GET", "/stats")
+        wall_start = time.perf_counter()
+
+        per_connection, extra = divmod(self.args.sessions, self.args.connections)
+        await asyncio.gather(*[self.run_connection(number, per_connection + (1 if number < extra else 0))
+                               for number in range(self.args.connections)])
+
+        wall_seconds = time.perf_counter() - wall_start
+        _, stats_after = await self.request("GET", "/stats")
+        cpu_seconds = stats_after["cpu_seconds"] - stats_before["cpu_seconds"]
+        latencies = sorted(self.start_latencies)
+        delays = sorted(self.delivery_delays)
+
+        return {
+            "sessions": self.args.sessions,
+            "connections": self.args.connections,
+            "duration_seconds": self.args.duration,
+            "start_errors": self.start_errors,
+            "start_ms_median": round(statistics.median(latencies) * 1000, 3) if latencies else None,
+            "start_ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None,
+            "ticks_received": self.ticks,
+            "ticks_expected": (self.args.sessions - self.start_errors) * self.args.duration,
+            "finished_received": self.finished,
+            "delivery_ms_median": round(statistics.median(delays) * 1000, 3) if delays else None,
+            "delivery_ms_p99": round(delays[int(len(delays) * 0.99)] * 1000, 3) if delays else None,
+            "wall_seconds": round(wall_seconds, 3),
+            "service_cpu_seconds": round(cpu_seconds, 3),
+            "service_cpu_percent": round(cpu_seconds / wall_seconds * 100, 1),
+            "subscribers_dropped": stats_after["subscribers_dropped"] - stats_before["subscribers_dropped"],
+            "write_queue_max_depth": stats_after["write_queue_max_depth"],
+            "write_queue_max_flush_ms": round(stats_after["write_queue_max_flush_seconds"] * 1000, 3),
+        }
+
+"""Start PomodoroService.py in a new process and wait until it is listening"""
+
+def start_service(directory, unix_path):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PomodoroService.py")
+    process = subprocess.Popen([sys.executable, script, "--unix", unix_path, "--database", os.path.join(directory, "load.db")],
+                               stdout = subprocess.PIPE, text = True)
+    process.stdout.readline()       #"Serving on ..."
+    return process
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Load test PomodoroService.py with many subscribed sessions")
+    parser.add_argument("--sessions", type = int, default = 2000, help = "number of sessions to start and follow")
+    parser.add_argument("--connections", type = int, default = 100, help = "number of client connections")
+    parser.add_argument("--duration", type = int, default = 20, help = "length of every session in seconds")
+    parser.add_argument("--url", help = "URL of a running service, for example http://127.0.0.1:8765")
+    parser.add_argument("--unix", help = "Unix socket of a running service")
+    parser.add_argument("--run-name", default = str(int(time.time())), help = "added to the task names, which must be unique per day")
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    service = None
+    directory = tempfile.TemporaryDirectory()
+
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port, unix_path = url.hostname, url.port or 80, None
+    elif args.unix:
+        host, port, unix_path = None, None, args.unix
+    else:
+        host, port, unix_path = None, None, os.path.join(directory.name, "pomodoro.sock")
+        service = start_service(directory.name, unix_path)
+
+    try:
+        results = asyncio.run(Load(args, host, port, unix_path).run())
+        print(json.dumps(results, indent = 2))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+        directory.cleanup()
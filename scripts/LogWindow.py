@@ -1,141 +1,524 @@
-"""Log Window
-
-This script creates a notebook with each tab representing a date when task(s)
-was done using the Pomodoro timer. Each task stored in each tab is presented as
-a tree view with the following headings: "Name", "Full 25 Minutes", "Time".
-
-The instantiating class (master) must provide implmenation for get_unique_dates(),
-get_tasks_by_date() and delete_task() method.
-
-Laste edited: 2020-12-24
-"""
-
-import tkinter as tk
-from tkinter import messagebox as msg
-from tkinter import *
-
-class LogWindow(tk.Toplevel):
-    def  __init__(self, master):
-        super().__init__()     #intit for tk.Toplevel
-
-        self.title("Log")
-
-        """Center log window next to main window on the right"""
-
-        logWindow_width = 600
-        logWIndow_height = 200
-
-        screen_width = self.winfo_screenwidth()
-        screen_height = self.winfo_screenheight()
-
-        xLeft = int((screen_width/2) - (logWindow_width/2)) + 600
-        yTop = int((screen_height/2) - (logWIndow_height/2))
-
-        self.geometry(str(logWindow_width) + "x" + str(logWIndow_height) + "+" + str(xLeft) + "+" + str(yTop))
-        self.resizable(width = 0, height = 0)
-
-        #creates tabbed interface inside window
-        self.notebook = ttk.Notebook(self)
-
-        #define a dictionary in a "list" called a literal.
-        self.tab_trees  =  {}
-
-        style = ttk.Style()
-        style.configure("Treeview", font=(None,12))
-        style.configure("Treeview.Heading", font=(None, 14))
-
-        """get_unique_dates() returns a list of unique datetime.
-
-        example return: '2020-12-20 20:46:54.584119'. For log, we just want the date portion.
-        """
-
-        dates = self.master.get_unique_dates()
-
-        """Formate unique dates to only get the date portion
-
-        Enumerate(dates) addes a counter "index" to iterable
-        the for loop replaces each item in dates list with just the firstportion of the date and time
-
-        split() returns a list with the date and tiem splitted: ['2020-12-20', '20:46:54.584119']
-        Get only the date portion .split()[0]
-        """
-
-        for index, date in enumerate(dates):
-            dates[index] = date[0].split()[0]
-
-        #turn dates list into a set to get the unique items and sort in descending order
-        dates = sorted(set(dates), reverse = True)
-
-        """Populate each tab with all tasks from a specific date and then add tab to notebook
-
-        A list of task is returned by instantiating class (master) get_tasks_by_date() method. The
-        returned attibutes are assigned to the headings of the treeview. Double clicking on a task
-        is will trigger deletion method to remove task.
-        """
-
-        for date in dates:
-            tab = tk.Frame(self.notebook)
-
-            columns = ("name", "finished", "time")
-
-            tree = ttk.Treeview(tab, columns = columns, show = "headings")
-
-            tree.heading("name", text = "Name")
-            tree.heading("finished", text = "Full 25 Minutes")
-            tree.heading("time", text = "Time")
-
-            tree.column("name", anchor = "center")
-            tree.column("finished", anchor = "center")
-            tree.column("time", anchor = "center")
-
-            tasks = self.master.get_tasks_by_date(date)
-
-            for task_name, task_finished, task_date in tasks:
-                task_finished_text = "Yes" if task_finished else "No"
-                task_time = task_date.split()[1]
-                task_time_pieces = task_time.split(":")
-                #Display only hours and minutes of task time
-                task_time_pretty = "{}:{}".format(task_time_pieces[0], task_time_pieces[1])
-                tree.insert("", tk.END, values = (task_name, task_finished_text, task_time_pretty))
-
-            tree.pack(side = 'left', fill = tk.BOTH, expand = 1)
-
-            scroll_bar = ttk.Scrollbar(tree, orient = "vertical", command = tree.yview, )
-            scroll_bar.pack(side = 'right', fill='y')
-
-            tree.configure(yscrollcommand = scroll_bar.set)
-
-            #binds double-click to open delete task pane
-            tree.bind("<Double-Button-1>", self.confirm_delete)
-
-            #for index "date" in list tab_tress, store tree object
-            self.tab_trees[date]  =  tree
-
-            self.notebook.add(tab, text = date)
-
-        self.notebook.pack(fill = tk.BOTH, expand = 1)
-
-    """Delete selected task in tree view
-
-    Deletes task from tree view and from databsed through instantiating class (master) delete_task()
-    """
-
-    def confirm_delete(self, event = None):
-        #get tab label as a text and store in current_tab
-        current_tab = self.notebook.tab(self.notebook.select(), "text")
-        tree = self.tab_trees[current_tab]
-        selected_item_id = tree.selection()
-
-        #tree.item returns a dictionary.
-        #"values" holds row's list of task_name, task_finished_text, and task_time_pretty
-        selected_item = tree.item(selected_item_id)
-
-        #get first item in tree object, which is task_name
-        if msg.askyesno("Delete Item?", "Delete" + selected_item["values"][0] + "?", parent = self):
-            task_name = selected_item["values"][0]
-            task_time = selected_item["values"][2]
-
-            #join list containing current_tabl and task_time with a " "
-            task_date = " ".join([current_tab, task_time])
-            self.master.delete_task(task_name, task_date)
-            tree.delete(selected_item_id)
+"""Log Window
+
+This script creates a notebook with each tab representing a date when task(s)
+was done using the Pomodoro timer. Each task stored in each tab is presented as
+a tree view with the following headings: "Name", "Full 25 Minutes", "Time".
+
+Tabs are created empty and their tasks are loaded page by page as the tab is
+selected and scrolled. The last tab, "Stats", shows the number of pomodoros per
+day from the store's daily summaries.
+
+The window is built once and kept up to date: it listens to the store's
+changes (tasks added, finished and deleted) and patches only the rows, tabs
+and statistics they affect. Closing the window hides it, and show() brings it
+back as it was, without reading the database again.
+
+The search box above the tabs finds tasks by name across every date as it is
+typed. Matches are shown best first in a "Search" tab, paged like a date tab.
+
+The store archives old months in the background when it opens, and reads do
+not wait for it, so the window never freezes on it. The dates it may move and
+the search results are read again once it is done.
+
+Tasks are read from and deleted through a TaskStore object ("store"), which
+provides get_unique_dates(), get_tasks_by_date(), search_tasks(), delete_tasks(),
+get_daily_summary(), add_listener() and remove_listener().
+
+Every row of a tree view has the id of its task as item id, so rows are
+deleted by primary key. Several rows can be selected with Shift and Ctrl and
+deleted together with a double-click or the Delete key.
+
+Laste edited: 2020-12-24
+"""
+
+import time
+import tkinter as tk
+from tkinter import messagebox as msg
+from tkinter import *
+import Metrics
+from UiChannel import UiChannel
+
+class LogWindow(tk.Toplevel):
+
+    #number of tasks added to a tree view at a time
+    PAGE_SIZE = 100
+
+    #load the next page once the end of the rows shown passes this fraction of the loaded rows
+    LOAD_MORE_AT = 0.9
+
+    #label of the statistics tab, after the date tabs
+    STATS_TAB = "Stats"
+
+    #label of the search results tab, added before the date tabs on the first search
+    SEARCH_TAB = "Search"
+
+    #the search runs once no key has been typed for this long
+    SEARCH_DELAY_MS = 150
+
+    #how often a pending database write is checked for completion
+    POLL_MS = 20
+
+    def  __init__(self, master, store, ui_channel = None):
+        super().__init__(master)     #intit for tk.Toplevel
+        self.store = store
+
+        self.title("Log")
+
+        """Center log window next to main window on the right"""
+
+        logWindow_width = 600
+        logWIndow_height = 230
+
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+
+        xLeft = int((screen_width/2) - (logWindow_width/2)) + 600
+        yTop = int((screen_height/2) - (logWIndow_height/2))
+
+        self.geometry(str(logWindow_width) + "x" + str(logWIndow_height) + "+" + str(xLeft) + "+" + str(yTop))
+        self.resizable(width = 0, height = 0)
+
+        #search box, searches as the text changes
+        self.search_var = tk.StringVar(self)
+        self.search_var.trace_add("write", self.on_search_changed)
+        self.search_after_id = None
+        self.search_tree = None
+
+        search_frame = tk.Frame(self)
+        ttk.Label(search_frame, text = "Search:", font = (None, 12)).pack(side = "left", padx = 5)
+        ttk.Entry(search_frame, textvariable = self.search_var).pack(side = "left", fill = tk.X, expand = 1, padx = (0,5))
+        search_frame.pack(fill = tk.X, pady = 2)
+
+        #creates tabbed interface inside window
+        self.notebook = ttk.Notebook(self)
+
+        #define a dictionary in a "list" called a literal.
+        self.tab_trees  =  {}
+
+        style = ttk.Style()
+        style.configure("Treeview", font=(None,12))
+        style.configure("Treeview.Heading", font=(None, 14))
+
+        """Create one empty tab for each date and fill a tab only when it is first selected
+
+        get_unique_dates() returns a list of unique days in descending order, for
+        example: [('2020-12-20',), ('2020-12-19',)]. Tasks of a date are loaded in pages
+        of PAGE_SIZE rows, first when its tab is selected and then whenever its tree
+        view is scrolled near the end, so memory grows only with what has been viewed.
+        """
+
+        #for each date, (date, id) of the last task loaded. Dates without more tasks are in loaded_dates
+        self.tab_last_task = {}
+        self.loaded_dates = set()
+
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+        for date in self.store.get_unique_dates():
+            self.add_date_tab(date[0])
+
+        self.add_stats_tab()
+        self.load_stats()
+
+        self.notebook.pack(fill = tk.BOTH, expand = 1)
+
+        """Receive the store's changes on this window's thread
+
+        The store calls on_store_changed() on its write queue thread, which posts
+        the change on a UI channel. The Timer window passes its own, which it
+        drains while the writes of a session are pending; otherwise the window
+        has its own. Either way the channel is drained while the deletes made
+        from this window are pending. The listener is added after the dates and
+        statistics are read, which waits for pending writes, so no change is
+        counted twice.
+        """
+
+        self.owns_ui_channel = ui_channel is None
+        self.ui_channel = ui_channel or UiChannel(self)
+        self.store.add_listener(self.on_store_changed)
+
+        #closing the window only hides it, show() brings it back
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+
+        #dates read while the rollover may still move them
+        self.dates_read_early = set()
+        self.search_read_early = False
+        if self.store.rollover_pending():
+            self.after(LogWindow.POLL_MS, self.reload_after_rollover)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+        self.focus_set()
+
+    def destroy(self):
+        self.store.remove_listener(self.on_store_changed)
+        if self.owns_ui_channel:
+            self.ui_channel.stop()
+        super().destroy()
+
+    """Create an empty tab with a scrollable tree view for a date and add it to notebook
+
+    The tab is added at "index", by default after the tabs already added.
+    """
+
+    def add_date_tab(self, date, index = "end"):
+        tab = tk.Frame(self.notebook)
+
+        columns = ("name", "finished", "time")
+
+        tree = ttk.Treeview(tab, columns = columns, show = "headings", selectmode = "extended")
+
+        tree.heading("name", text = "Name")
+        tree.heading("finished", text = "Full 25 Minutes")
+        tree.heading("time", text = "Time")
+
+        tree.column("name", anchor = "center")
+        tree.column("finished", anchor = "center")
+        tree.column("time", anchor = "center")
+
+        tree.pack(side = 'left', fill = tk.BOTH, expand = 1)
+
+        scroll_bar = ttk.Scrollbar(tree, orient = "vertical", command = tree.yview, )
+        scroll_bar.pack(side = 'right', fill='y')
+
+        #the first page is loaded by on_tab_changed(), later pages when scrolled near the end
+        def on_scroll(first, last):
+            scroll_bar.set(first, last)
+            if date in self.tab_last_task and float(last) > LogWindow.LOAD_MORE_AT:
+                self.load_next_page(date)
+
+        tree.configure(yscrollcommand = on_scroll)
+
+        #binds double-click and Delete key to open delete task pane
+        tree.bind("<Double-Button-1>", self.confirm_delete)
+        tree.bind("<Delete>", self.confirm_delete)
+
+        #for index "date" in list tab_tress, store tree object
+        self.tab_trees[date]  =  tree
+
+        self.notebook.insert(index, tab, text = date)
+        return tree
+
+    """Create the search results tab, in front of the date tabs
+
+    Results are paged in as the tree view is scrolled, the same way as the tasks
+    of a date, with "search_last_task" holding the (source, rank, id) of the last
+    result shown or None once every result is shown.
+    """
+
+    def add_search_tab(self):
+        tab = tk.Frame(self.notebook)
+
+        columns = ("name", "finished", "time")
+
+        self.search_tree = ttk.Treeview(tab, columns = columns, show = "headings", selectmode = "extended")
+
+        self.search_tree.heading("name", text = "Name")
+        self.search_tree.heading("finished", text = "Full 25 Minutes")
+        self.search_tree.heading("time", text = "Date")
+
+        for column in columns:
+            self.search_tree.column(column, anchor = "center")
+
+        self.search_tree.pack(side = 'left', fill = tk.BOTH, expand = 1)
+
+        scroll_bar = ttk.Scrollbar(self.search_tree, orient = "vertical", command = self.search_tree.yview, )
+        scroll_bar.pack(side = 'right', fill='y')
+
+        def on_scroll(first, last):
+            scroll_bar.set(first, last)
+            if self.search_last_task is not None and float(last) > LogWindow.LOAD_MORE_AT:
+                self.load_search_page()
+
+        self.search_tree.configure(yscrollcommand = on_scroll)
+        self.search_tree.bind("<Double-Button-1>", self.confirm_delete)
+        self.search_tree.bind("<Delete>", self.confirm_delete)
+
+        self.notebook.insert(0, tab, text = LogWindow.SEARCH_TAB)
+
+    """Run the search once typing pauses for SEARCH_DELAY_MS"""
+
+    def on_search_changed(self, *args):
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(LogWindow.SEARCH_DELAY_MS, self.search)
+
+    def search(self):
+        self.search_after_id = None
+        if self.search_tree is None:
+            self.add_search_tab()
+
+        self.search_tree.delete(*self.search_tree.get_children())
+        self.search_text = self.search_var.get()
+        self.search_last_task = ()
+        self.load_search_page()
+        self.notebook.select(0)
+
+    """Add the next page of search results to the search tab"""
+
+    def load_search_page(self):
+        self.search_read_early |= self.store.rollover_pending()
+        tasks = self.store.search_tasks(self.search_text, self.search_last_task or None, LogWindow.PAGE_SIZE)
+
+        for task_id, task_name, task_finished, task_date, rank, source in tasks:
+            task_finished_text = "Yes" if task_finished else "No"
+            #Display date, hours and minutes of task time: '2020-12-20 20:46:54.584119' -> '2020-12-20 20:46'
+            self.search_tree.insert("", tk.END, iid = task_id, values = (task_name, task_finished_text, task_date[:16]))
+
+        if len(tasks) < LogWindow.PAGE_SIZE:
+            self.search_last_task = None
+        else:
+            self.search_last_task = (tasks[-1][5], tasks[-1][4], tasks[-1][0])
+
+    """Create the statistics tab with a totals label above a tree view of days"""
+
+    def add_stats_tab(self):
+        tab = tk.Frame(self.notebook)
+
+        self.stats_totals_var = tk.StringVar(tab)
+        ttk.Label(tab, textvar = self.stats_totals_var).pack(fill = tk.X)
+
+        columns = ("day", "started", "finished", "early")
+
+        self.stats_tree = ttk.Treeview(tab, columns = columns, show = "headings")
+
+        self.stats_tree.heading("day", text = "Date")
+        self.stats_tree.heading("started", text = "Pomodoros")
+        self.stats_tree.heading("finished", text = "Full 25 Minutes")
+        self.stats_tree.heading("early", text = "Finished Early")
+
+        for column in columns:
+            self.stats_tree.column(column, anchor = "center", width = 140)
+
+        self.stats_tree.pack(side = 'left', fill = tk.BOTH, expand = 1)
+
+        scroll_bar = ttk.Scrollbar(self.stats_tree, orient = "vertical", command = self.stats_tree.yview, )
+        scroll_bar.pack(side = 'right', fill='y')
+
+        self.stats_tree.configure(yscrollcommand = scroll_bar.set)
+
+        self.notebook.add(tab, text = LogWindow.STATS_TAB)
+
+    """Fill the statistics tab from the daily summaries
+
+    Only the daily summaries are read (one row per day), so this stays fast
+    however many tasks have been logged. It is done once, when the window is
+    built. After that, "day_stats" holds the [started, finished] count of every
+    day and is updated with each change from the store, as are the rows of the
+    tab, which have the day as item id.
+    """
+
+    def load_stats(self):
+        self.day_stats = {}
+        for day, day_started, day_finished in self.store.get_daily_summary():
+            self.day_stats[day] = [day_started, day_finished]
+            self.stats_tree.insert("", tk.END, iid = day, values = self.stats_values(day))
+        self.show_stats_totals()
+
+    def stats_values(self, day):
+        started, finished = self.day_stats[day]
+        early_percent = (started - finished) / started * 100
+        return (day, started, finished, "{:.0f}%".format(early_percent))
+
+    def show_stats_totals(self):
+        started = sum(day_started for day_started, _ in self.day_stats.values())
+        finished = sum(day_finished for _, day_finished in self.day_stats.values())
+        early_percent = (started - finished) / started * 100 if started else 0
+        self.stats_totals_var.set("{} pomodoros over {} days, {:.0f}% finished early".format(started, len(self.day_stats), early_percent))
+
+    """Add "started" and "finished" to the statistics of a day
+
+    A day seen for the first time gets a row, and a day left without tasks
+    loses its row and its tab.
+    """
+
+    def update_stats(self, day, started, finished):
+        if day not in self.day_stats:
+            if started <= 0:
+                return
+            self.day_stats[day] = [0, 0]
+            index = sum(1 for other_day in self.day_stats if other_day > day)
+            self.stats_tree.insert("", index, iid = day)
+
+        self.day_stats[day][0] += started
+        self.day_stats[day][1] += finished
+
+        if self.day_stats[day][0] > 0:
+            self.stats_tree.item(day, values = self.stats_values(day))
+        else:
+            del self.day_stats[day]
+            self.stats_tree.delete(day)
+            self.remove_date_tab(day)
+
+    def remove_date_tab(self, date):
+        tree = self.tab_trees.pop(date, None)
+        if tree is not None:
+            self.tab_last_task.pop(date, None)
+            self.loaded_dates.discard(date)
+            self.notebook.forget(tree.master)
+            tree.master.destroy()
+
+    """Called by the store on its write queue thread, see add_listener() in TaskStore.py"""
+
+    def on_store_changed(self, change, tasks):
+        self.ui_channel.post(None, self.apply_change, change, tasks)
+
+    """Patch the tree views and statistics affected by a change from the store
+
+    An added task is shown at the end of its date tab if every task of the date
+    is already shown. If the tab has not been loaded yet, or still has pages to
+    load, the task is shown with those pages. A date without a tab gets a new tab,
+    which holds only this task. Finished and deleted tasks are updated or removed
+    in every tree view showing them, search results included.
+    """
+
+    def apply_change(self, change, tasks):
+        for task_id, task_name, task_finished, task_date in tasks:
+            day = task_date[:10]
+
+            if change == "added":
+                if day not in self.tab_trees:
+                    index = (1 if self.search_tree is not None else 0) + sum(1 for date in self.tab_trees if date > day)
+                    self.add_date_tab(day, index)
+                    self.tab_last_task[day] = None
+                    self.loaded_dates.add(day)
+                tree = self.tab_trees[day]
+                if day in self.loaded_dates and not tree.exists(task_id):
+                    task_finished_text = "Yes" if task_finished else "No"
+                    tree.insert("", tk.END, iid = task_id, values = (task_name, task_finished_text, task_date[11:16]))
+                    self.tab_last_task[day] = (task_date, task_id)
+                self.update_stats(day, 1, task_finished)
+
+            elif change == "finished":
+                for tree in self.trees():
+                    if tree.exists(task_id):
+                        tree.set(task_id, "finished", "Yes")
+                self.update_stats(day, 0, 1)
+
+            elif change == "deleted":
+                self.remove_rows([task_id])
+                self.update_stats(day, -1, -task_finished)
+
+    def on_tab_changed(self, event = None):
+        if not self.notebook.select():
+            return
+        current_tab = self.notebook.tab(self.notebook.select(), "text")
+        if current_tab in (LogWindow.STATS_TAB, LogWindow.SEARCH_TAB):
+            return
+        elif current_tab not in self.tab_last_task:
+            self.load_next_page(current_tab)
+
+    """Add the next page of tasks of a date to its tree view
+
+    A list of task is returned by the store's get_tasks_by_date() method. The returned attibutes are assigned to the headings of the treeview.
+    Double clicking on a task is will trigger deletion method to remove task.
+
+    The time to read and insert the page is recorded in Metrics when
+    instrumentation is enabled.
+    """
+
+    def load_next_page(self, date):
+        if date in self.loaded_dates:
+            return
+
+        start = time.perf_counter() if Metrics.enabled else None
+
+        tree = self.tab_trees[date]
+        if self.store.rollover_pending(date):
+            self.dates_read_early.add(date)
+        tasks = self.store.get_tasks_by_date(date, self.tab_last_task.get(date), LogWindow.PAGE_SIZE)
+
+        for task_id, task_name, task_finished, task_date in tasks:
+            task_finished_text = "Yes" if task_finished else "No"
+            #Display only hours and minutes of task time: '2020-12-20 20:46:54.584119' -> '20:46'
+            task_time_pretty = task_date[11:16]
+            tree.insert("", tk.END, iid = task_id, values = (task_name, task_finished_text, task_time_pretty))
+
+        if tasks:
+            self.tab_last_task[date] = (tasks[-1][3], tasks[-1][0])
+        else:
+            self.tab_last_task.setdefault(date, None)
+        if len(tasks) < LogWindow.PAGE_SIZE:
+            self.loaded_dates.add(date)
+
+        if start is not None:
+            Metrics.observe("log_window_tab_build_seconds", time.perf_counter() - start)
+
+    """Read again what was read while the rollover was pending, once it is done
+
+    The rollover runs on the write queue thread, so it is polled with after()
+    like a delete. The tabs of the dates read early are emptied and the one
+    selected is loaded again; the others load when selected. The search is run
+    again if it was read early.
+    """
+
+    def reload_after_rollover(self):
+        if self.store.rollover_pending():
+            self.after(LogWindow.POLL_MS, self.reload_after_rollover)
+            return
+
+        for date in self.dates_read_early:
+            if date in self.tab_trees:
+                tree = self.tab_trees[date]
+                tree.delete(*tree.get_children())
+                self.tab_last_task.pop(date, None)
+                self.loaded_dates.discard(date)
+        self.dates_read_early.clear()
+        self.on_tab_changed()
+
+        if self.search_read_early:
+            self.search_read_early = False
+            if self.search_tree is not None and self.search_after_id is None:
+                selected = self.notebook.select()
+                self.search()
+                self.notebook.select(selected)
+
+    """Delete the selected tasks in tree view
+
+    The item ids of the selected rows are the ids of their tasks, so every
+    selected task is deleted from the database with one confirmation and one
+    transaction through the store's delete_tasks(). Once committed, the store's
+    "deleted" change removes the rows from every tree view showing them (a date
+    tab and the search tab).
+    """
+
+    def confirm_delete(self, event = None):
+        #get tab label as a text and store in current_tab
+        current_tab = self.notebook.tab(self.notebook.select(), "text")
+        tree = self.search_tree if current_tab == LogWindow.SEARCH_TAB else self.tab_trees[current_tab]
+        selected_item_ids = tree.selection()
+        if not selected_item_ids:
+            return
+
+        if len(selected_item_ids) == 1:
+            #tree.item returns a dictionary. "values" holds row's list of task_name, task_finished_text, and task_time_pretty
+            question = "Delete " + str(tree.item(selected_item_ids[0])["values"][0]) + "?"
+        else:
+            question = "Delete {} tasks?".format(len(selected_item_ids))
+
+        if msg.askyesno("Delete Item?", question, parent = self):
+            deleted = self.store.delete_tasks([int(item_id) for item_id in selected_item_ids])
+            self.ui_channel.poll_while(self.store.has_pending_writes)
+            self.show_error_if_failed(deleted)
+
+    def trees(self):
+        return list(self.tab_trees.values()) + ([self.search_tree] if self.search_tree is not None else [])
+
+    def remove_rows(self, item_ids):
+        for tree in self.trees():
+            rows = [item_id for item_id in item_ids if tree.exists(item_id)]
+            if rows:
+                tree.delete(*rows)
+
+    """Show an error message on the GUI thread if a Future from the write queue fails
+
+    Futures complete on the write queue thread, which must not touch tkinter, so
+    the Future is polled with after() instead. If the write failed, the tree view
+    is left unchanged.
+    """
+
+    def show_error_if_failed(self, future):
+        if not future.done():
+            self.after(LogWindow.POLL_MS, self.show_error_if_failed, future)
+        elif future.exception() is not None:
+            msg.showerror("Delete Failed", str(future.exception()), parent = self)
@@ -0,0 +1,80 @@
+"""LRU Cache
+
+This script creates a bounded, thread-safe least recently used cache. When the
+cache is full, adding an entry evicts the entry that was used the longest time
+ago. Hits, misses and evictions are counted and returned by stats().
+
+Entries are changed with update(), which is how writes are applied to cached
+values instead of dropping them. update() changes a copy of the value and
+stores it in its place, so a value returned by get() is never changed
+afterwards and can be read outside of the lock while writes are applied.
+Every update() or invalidate() bumps "generation", so a value read from the
+database before a write can be stored with put(..., generation) only if no
+write happened in between.
+"""
+
+import collections
+import copy
+import threading
+
+class LruCache():
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    """Return the value of key and mark it as the most recently used, or None"""
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    """Store value for key, unless a write happened since "generation" was read"""
+
+    def put(self, key, value, generation = None):
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last = False)
+                self.evictions += 1
+
+    """Call change(value) on a copy of the cached value of key, if there is one, and cache the copy instead"""
+
+    def update(self, key, change):
+        with self.lock:
+            self.generation += 1
+            value = self.entries.get(key)
+            if value is not None:
+                value = copy.copy(value)
+                change(value)
+                self.entries[key] = value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,210 @@
+"""Metrics
+
+This script collects timings and counts from the hot paths of the Pomodoro
+timer app: query time in Database.runQuery, batch time of WriteQueue, ticks,
+tick lateness and CPU time of CountingThread, build time of LogWindow tabs, and
+the delay of GUI updates passed through UiChannel.
+
+Instrumentation is off by default. It is turned on by setting the environment
+variable POMODORO_METRICS=1 before starting the app, by calling enable(), or
+from the "Metrics" entry of the Log menu. While it is off, an instrumented path
+only checks the module variable "enabled", so it costs next to nothing:
+
+    start = time.perf_counter() if Metrics.enabled else None
+    ...
+    if start is not None:
+        Metrics.observe("database_query_seconds", time.perf_counter() - start)
+
+Timings are kept in histograms with fixed buckets, so recording one is a
+bisect and a few additions whatever the number of observations. The collected
+values can be written to a Prometheus text file (for the node exporter textfile
+collector, for example) or to a JSON snapshot:
+
+    python Metrics.py --prometheus metrics.prom --json metrics.json
+"""
+
+import bisect
+import json
+import os
+import threading
+
+enabled = os.environ.get("POMODORO_METRICS", "") not in ("", "0")
+
+#upper bounds of the histogram buckets in seconds, from 10 microseconds to 10 seconds
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+#help text of the metrics recorded by the app, used in the Prometheus export
+DESCRIPTIONS = {
+    "database_query_seconds": "Time spent in Database.runQuery",
+    "write_queue_flush_seconds": "Time to run and commit a batch of WriteQueue writes",
+    "counting_thread_ticks_total": "Countdown values pushed by CountingThread",
+    "counting_thread_tick_lateness_seconds": "Delay between a whole second of the countdown and its tick",
+    "counting_thread_cpu_seconds_total": "CPU time used by finished CountingThread objects",
+    "log_window_tab_build_seconds": "Time to build a page of a LogWindow tab",
+    "ui_channel_latency_seconds": "Delay between a GUI update posted to UiChannel and its redraw",
+}
+
+class Histogram():
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)      #the last bucket is +Inf
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    """Estimate a quantile (0 to 1) as the upper bound of the bucket it falls in"""
+
+    def quantile(self, fraction):
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return 0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], self.counts)),
+        }
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+"""Forget every value recorded so far"""
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+"""Record a timing (or any other value) in the histogram called name"""
+
+def observe(name, value):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+"""Add amount to the counter called name"""
+
+def increment(name, amount = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+"""Return every counter and histogram as a dictionary that can be saved as JSON"""
+
+def snapshot():
+    with _lock:
+        return {
+            "enabled": enabled,
+            "counters": dict(_counters),
+            "histograms": {name: histogram.snapshot() for name, histogram in _histograms.items()},
+        }
+
+"""Return every counter and histogram in the Prometheus text exposition format"""
+
+def prometheus_text(prefix = "pomodoro_"):
+    values = snapshot()
+    lines = []
+
+    for name, value in sorted(values["counters"].items()):
+        lines.append("# HELP {}{} {}".format(prefix, name, DESCRIPTIONS.get(name, name)))
+        lines.append("# TYPE {}{} counter".format(prefix, name))
+        lines.append("{}{} {}".format(prefix, name, value))
+
+    for name, histogram in sorted(values["histograms"].items()):
+        lines.append("# HELP {}{} {}".format(prefix, name, DESCRIPTIONS.get(name, name)))
+        lines.append("# TYPE {}{} histogram".format(prefix, name))
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            lines.append('{}{}_bucket{{le="{}"}} {}'.format(prefix, name, bound, cumulative))
+        lines.append("{}{}_sum {}".format(prefix, name, histogram["sum"]))
+        lines.append("{}{}_count {}".format(prefix, name, histogram["count"]))
+
+    return "\n".join(lines) + "\n"
+
+"""Write a file through a temporary file, so a reader never sees it half written"""
+
+def _write_file(path, text):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding = "utf-8") as output_file:
+        output_file.write(text)
+    os.replace(temporary_path, path)
+
+def write_prometheus(path):
+    _write_file(path, prometheus_text())
+
+def write_json(path):
+    _write_file(path, json.dumps(snapshot(), indent = 2))
+
+if __name__ == "__main__":
+
+    import argparse
+    import datetime
+    import tempfile
+    #the instrumented modules record into the imported module, not into __main__
+    import Metrics
+    from Database import Database
+    from TaskStore import TaskStore
+    from CountingThread import CountingThread
+
+    parser = argparse.ArgumentParser(description = "Exercise the instrumented paths of the Pomodoro timer app and export the metrics")
+    parser.add_argument("--database", help = "database file to query, by default a new temporary one")
+    parser.add_argument("--seconds", type = int, default = 3, help = "length of the CountingThread run")
+    parser.add_argument("--prometheus", help = "write the metrics to this Prometheus text file")
+    parser.add_argument("--json", help = "write the metrics to this JSON file")
+    args = parser.parse_args()
+
+    Metrics.enable()
+
+    class _Master():
+        def update_time_remaining(self, time_string):
+            pass
+
+        def finish(self):
+            pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TaskStore(Database(args.database or os.path.join(directory, "pomodoro.db")), keep_months = None)
+        for date in store.get_unique_dates():
+            store.get_tasks_by_date(date[0])
+        store.task_is_duplicate("Sample Task 1")
+        store.close()
+
+    master = _Master()
+    now = datetime.datetime.now()
+    master.worker = CountingThread(master, now, now + datetime.timedelta(seconds = args.seconds))
+    master.worker.start()
+    master.worker.join()
+
+    if args.prometheus:
+        Metrics.write_prometheus(args.prometheus)
+    if args.json:
+        Metrics.write_json(args.json)
+    if not (args.prometheus or args.json):
+        print(Metrics.prometheus_text(), end = "")
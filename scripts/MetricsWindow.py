@@ -0,0 +1,116 @@
+"""Metrics Window
+
+This script creates a debug window that shows the live values collected by
+Metrics.py: one row per counter or histogram, refreshed every second. Counters
+show their total and rate per second, histograms their count, median, 99th
+percentile and maximum in milliseconds.
+
+The window can turn instrumentation on and off, clear the values, and export
+them to a Prometheus text file or a JSON snapshot.
+"""
+
+import time
+import tkinter as tk
+from tkinter import filedialog
+from tkinter import messagebox as msg
+from tkinter import ttk
+import Metrics
+
+class MetricsWindow(tk.Toplevel):
+
+    REFRESH_MS = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Metrics")
+        self.geometry("700x250")
+
+        self.enabled_var = tk.BooleanVar(self, Metrics.enabled)
+
+        buttons = tk.Frame(self)
+        ttk.Checkbutton(buttons, text = "Enabled", variable = self.enabled_var, command = self.toggle).pack(side = "left", padx = 5)
+        ttk.Button(buttons, text = "Reset", command = self.reset).pack(side = "left", padx = 5)
+        ttk.Button(buttons, text = "Export Prometheus...", command = self.export_prometheus).pack(side = "left", padx = 5)
+        ttk.Button(buttons, text = "Export JSON...", command = self.export_json).pack(side = "left", padx = 5)
+        buttons.pack(fill = tk.X, pady = 5)
+
+        columns = ("name", "count", "rate", "p50", "p99", "max")
+        self.tree = ttk.Treeview(self, columns = columns, show = "headings")
+
+        self.tree.heading("name", text = "Metric")
+        self.tree.heading("count", text = "Total")
+        self.tree.heading("rate", text = "Per Second")
+        self.tree.heading("p50", text = "Median ms")
+        self.tree.heading("p99", text = "p99 ms")
+        self.tree.heading("max", text = "Max ms")
+
+        self.tree.column("name", width = 250)
+        for column in columns[1:]:
+            self.tree.column(column, anchor = "center", width = 85)
+
+        self.tree.pack(fill = tk.BOTH, expand = 1)
+
+        #counts of the previous refresh, to show rates
+        self.last_counts = {}
+        self.last_refresh = time.perf_counter()
+
+        self.refresh()
+
+    """Redraw every row from a new snapshot and schedule the next refresh"""
+
+    def refresh(self):
+        values = Metrics.snapshot()
+        now = time.perf_counter()
+        elapsed = now - self.last_refresh
+
+        rows = []
+        for name, count in sorted(values["counters"].items()):
+            rows.append((name, count, self.rate(name, count, elapsed), "", "", ""))
+        for name, histogram in sorted(values["histograms"].items()):
+            count = histogram["count"]
+            rows.append((name, count, self.rate(name, count, elapsed), "{:.3f}".format(histogram["p50"] * 1000),
+                         "{:.3f}".format(histogram["p99"] * 1000), "{:.3f}".format(histogram["max"] * 1000)))
+
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert("", tk.END, values = row)
+
+        self.last_refresh = now
+        self.after_id = self.after(MetricsWindow.REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        self.after_cancel(self.after_id)
+        super().destroy()
+
+    def rate(self, name, count, elapsed):
+        last_count = self.last_counts.get(name)
+        self.last_counts[name] = count
+        if last_count is None or not elapsed:
+            return ""
+        return "{:.1f}".format((count - last_count) / elapsed)
+
+    def toggle(self):
+        if self.enabled_var.get():
+            Metrics.enable()
+        else:
+            Metrics.disable()
+
+    def reset(self):
+        Metrics.reset()
+        self.last_counts = {}
+
+    def export_prometheus(self):
+        path = filedialog.asksaveasfilename(parent = self, defaultextension = ".prom", initialfile = "pomodoro.prom")
+        if path:
+            self.export(Metrics.write_prometheus, path)
+
+    def export_json(self):
+        path = filedialog.asksaveasfilename(parent = self, defaultextension = ".json", initialfile = "pomodoro_metrics.json")
+        if path:
+            self.export(Metrics.write_json, path)
+
+    def export(self, write, path):
+        try:
+            write(path)
+        except OSError as error:
+            msg.showerror("Export Failed", str(error), parent = self)
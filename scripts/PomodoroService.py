@@ -0,0 +1,464 @@
+"""Pomodoro Service
+
+This script runs the Pomodoro timer as a local service, so sessions can be
+started and followed from scripts, editor plugins or a web dashboard instead of
+the Timer window. It is a small HTTP/1.1 server on asyncio, listening on
+localhost or on a Unix socket, that answers with JSON:
+
+    POST /sessions                 {"task": "Write report", "duration": 1500}
+    GET  /sessions                 every running or paused session
+    GET  /sessions/<id>
+    POST /sessions/<id>/pause
+    POST /sessions/<id>/resume
+    POST /sessions/<id>/finish     finish early
+    GET  /sessions/<id>/events     countdown updates of a session
+    GET  /events?ids=1,2,3         countdown updates of several sessions
+    GET  /history                  days with tasks, newest first
+    GET  /history/<day>?limit=100&after_date=...&after_id=...
+    GET  /search?q=report&limit=100
+    GET  /stats
+
+Countdown updates are pushed as Server-Sent Events ("event: tick" with the
+remaining time, then "event: finished"). Every session schedules its next tick
+on the event loop with call_at(), so all sessions and subscribers are served
+by one thread however many there are. An update is encoded once and written
+to every subscriber; a subscriber that stops reading is dropped once
+MAX_SUBSCRIBER_BUFFER bytes are waiting for it.
+
+Tasks are stored through a TaskStore, like the Timer window: add_new_task()
+when a session starts and mark_finished_task() when its full duration has
+elapsed. Writes are awaited through their Future; reads that can block run in
+the loop's default executor. Failed writes and unexpected errors are reported on
+the service's error stream, standard error by default; a request that fails
+unexpectedly is answered with status 500.
+
+    python PomodoroService.py --port 8765
+    python PomodoroService.py --unix /tmp/pomodoro.sock
+    curl -X POST -d '{"task": "Write report"}' http://127.0.0.1:8765/sessions
+    curl -N http://127.0.0.1:8765/sessions/1/events
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import math
+import re
+import signal
+import sys
+import time
+import traceback
+import urllib.parse
+from Database import Database
+from TaskStore import TaskStore
+from PomodoroSession import PomodoroSession
+from TaskNameIndex import normalize
+
+class HttpError(Exception):
+    """Raised by a request handler to answer with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ServiceSession():
+
+    def __init__(self, session_id, task_name, started_time, end):
+        self.id = session_id
+        self.task_name = task_name
+        self.started_time = started_time
+        self.state = "running"
+        self.finished_early = False
+
+        #loop time when the countdown reaches zero, and the seconds left while paused
+        self.end = end
+        self.paused_remaining = None
+
+        #handle of the next tick scheduled with call_at(), and the subscriptions following the session
+        self.handle = None
+        self.subscriptions = set()
+
+    def remaining(self, now):
+        if self.paused_remaining is not None:
+            return self.paused_remaining
+        return max(0, self.end - now)
+
+    """Return the remaining time as "24:59", rounded down to the second like the Timer window (see CountingThread.py)"""
+
+    def time_string(self, now):
+        mins, secs = divmod(int(self.remaining(now)), 60)
+        return "{:02d}:{:02d}".format(mins, secs)
+
+    def to_dict(self, now):
+        return {
+            "id": self.id,
+            "task": self.task_name,
+            "state": self.state,
+            "started": self.started_time.isoformat(" "),
+            "remaining": self.time_string(now),
+            "subscribers": len(self.subscriptions),
+        }
+
+class Subscription():
+    """A client following the countdown of one or more sessions through one connection"""
+
+    def __init__(self, writer, session_ids):
+        self.writer = writer
+        self.waiting = set(session_ids)
+        self.done = asyncio.Event()
+
+class PomodoroService():
+
+    #bytes waiting to be sent to a subscriber before it is dropped
+    MAX_SUBSCRIBER_BUFFER = 64 * 1024
+
+    #longest session that can be started, in seconds
+    MAX_DURATION = 24 * 60 * 60
+
+    def __init__(self, store, default_duration = PomodoroSession.DURATION.total_seconds(), errors = sys.stderr):
+        self.store = store
+        self.default_duration = default_duration
+        self.errors = errors
+        self.loop = None
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+
+        #(day, normalized task name) of the sessions started and not finished, to refuse duplicates right away
+        self.running_names = set()
+
+        self.updates_sent = 0
+        self.subscribers_dropped = 0
+        self.started_at = time.monotonic()
+
+        self.routes = [
+            ("POST", re.compile(r"/sessions"), self.start_session),
+            ("GET", re.compile(r"/sessions"), self.list_sessions),
+            ("GET", re.compile(r"/sessions/(\d+)"), self.get_session),
+            ("POST", re.compile(r"/sessions/(\d+)/pause"), self.pause_session),
+            ("POST", re.compile(r"/sessions/(\d+)/resume"), self.resume_session),
+            ("POST", re.compile(r"/sessions/(\d+)/finish"), self.finish_session),
+            ("GET", re.compile(r"/history"), self.get_history),
+            ("GET", re.compile(r"/history/(\d{4}-\d{2}-\d{2})"), self.get_history_day),
+            ("GET", re.compile(r"/search"), self.search),
+            ("GET", re.compile(r"/stats"), self.get_stats),
+        ]
+
+    """Sessions
+
+    Each method runs on the event loop thread. The countdown of a session is a
+    chain of call_at() callbacks, one per displayed second.
+    """
+
+    async def start_session(self, query, body):
+        task_name = str(body.get("task", "")).strip()
+        if not task_name:
+            raise HttpError(400, "Please enter a task name")
+        try:
+            duration = float(body.get("duration", self.default_duration))
+        except (TypeError, ValueError):
+            raise HttpError(400, "duration must be a number of seconds")
+        #float() also accepts "NaN" and "Infinity", which would never end
+        if not math.isfinite(duration) or duration <= 0:
+            raise HttpError(400, "duration must be a positive number of seconds")
+        if duration > PomodoroService.MAX_DURATION:
+            raise HttpError(400, "duration must be at most {:d} seconds".format(PomodoroService.MAX_DURATION))
+
+        started_time = datetime.datetime.now()
+        name_key = (started_time.date(), normalize(task_name))
+        if name_key in self.running_names:
+            raise HttpError(409, "A session is already running for this task")
+
+        #the duplicate check is done by the insert itself, so it needs no read of its own
+        self.running_names.add(name_key)
+        try:
+            task_id = await asyncio.wrap_future(self.store.add_new_task(task_name, started_time, unique = True))
+        except BaseException:
+            self.running_names.discard(name_key)
+            raise
+        if task_id is None:
+            self.running_names.discard(name_key)
+            raise HttpError(409, "You have already performed this task today. Please enter a different task name")
+
+        session = ServiceSession(next(self.session_ids), task_name, started_time, self.loop.time() + duration)
+        self.sessions[session.id] = session
+        self.tick(session)
+        return 201, session.to_dict(self.loop.time())
+
+    async def list_sessions(self, query, body):
+        now = self.loop.time()
+        return 200, {"sessions": [session.to_dict(now) for session in self.sessions.values()]}
+
+    async def get_session(self, query, body, session_id):
+        return 200, self.find_session(session_id).to_dict(self.loop.time())
+
+    async def pause_session(self, query, body, session_id):
+        session = self.find_session(session_id)
+        if session.state == "running":
+            session.paused_remaining = session.remaining(self.loop.time())
+            session.state = "paused"
+            session.handle.cancel()
+            self.publish(session, "tick")
+        return 200, session.to_dict(self.loop.time())
+
+    async def resume_session(self, query, body, session_id):
+        session = self.find_session(session_id)
+        if session.state == "paused":
+            session.end = self.loop.time() + session.paused_remaining
+            session.paused_remaining = None
+            session.state = "running"
+            self.tick(session)
+        return 200, session.to_dict(self.loop.time())
+
+    async def finish_session(self, query, body, session_id):
+        session = self.find_session(session_id)
+        session.finished_early = True
+        self.finish(session)
+        return 200, session.to_dict(self.loop.time())
+
+    def find_session(self, session_id):
+        session = self.sessions.get(int(session_id))
+        if session is None:
+            raise HttpError(404, "No running session " + session_id)
+        return session
+
+    """Push the remaining time and schedule the next tick just after the next whole second"""
+
+    def tick(self, session):
+        now = self.loop.time()
+        remaining = session.remaining(now)
+        if remaining <= 0:
+            self.finish(session)
+            return
+        self.publish(session, "tick", now)
+        fraction = remaining - math.floor(remaining)
+        session.handle = self.loop.call_at(now + (fraction or 1) + 0.001, self.tick, session)
+
+    """End a session: store the result, tell the subscribers and forget the session
+
+    As in PomodoroSession, a task is marked finished only if its full duration
+    was used.
+    """
+
+    def finish(self, session):
+        if session.handle is not None:
+            session.handle.cancel()
+        if not session.finished_early:
+            self.store.mark_finished_task(session.task_name, session.started_time).add_done_callback(self.report_write_error)
+
+        session.state = "finished"
+        self.publish(session, "finished")
+        self.sessions.pop(session.id, None)
+        self.running_names.discard((session.started_time.date(), normalize(session.task_name)))
+
+        for subscription in session.subscriptions:
+            subscription.waiting.discard(session.id)
+            if not subscription.waiting:
+                subscription.done.set()
+        session.subscriptions.clear()
+
+    def report_write_error(self, future):
+        if future.exception() is not None:
+            print("Write failed:", future.exception(), file = self.errors, flush = True)
+
+    """Write one event to every subscriber of a session, encoded once"""
+
+    def publish(self, session, event, now = None):
+        if not session.subscriptions:
+            return
+        now = self.loop.time() if now is None else now
+        data = dict(session.to_dict(now), sent = time.time())
+        message = "event: {}\ndata: {}\n\n".format(event, json.dumps(data)).encode()
+
+        for subscription in list(session.subscriptions):
+            transport = subscription.writer.transport
+            if transport.is_closing() or transport.get_write_buffer_size() > PomodoroService.MAX_SUBSCRIBER_BUFFER:
+                self.drop(subscription, session)
+                continue
+            subscription.writer.write(message)
+            self.updates_sent += 1
+
+    def drop(self, subscription, session):
+        session.subscriptions.discard(subscription)
+        self.subscribers_dropped += 1
+        subscription.writer.transport.abort()
+        subscription.done.set()
+
+    """History, read through the TaskStore in the executor"""
+
+    async def get_history(self, query, body):
+        dates = await self.loop.run_in_executor(None, self.store.get_unique_dates)
+        return 200, {"dates": [date[0] for date in dates]}
+
+    async def get_history_day(self, query, body, day):
+        limit = int(query.get("limit", ["100"])[0])
+        after = (query["after_date"][0], int(query["after_id"][0])) if "after_date" in query else None
+        tasks = await self.loop.run_in_executor(None, self.store.get_tasks_by_date, day, after, limit)
+        return 200, {"tasks": [{"id": task_id, "task": task, "finished": bool(finished), "date": date}
+                               for task_id, task, finished, date in tasks]}
+
+    async def search(self, query, body):
+        text = query.get("q", [""])[0]
+        limit = int(query.get("limit", ["100"])[0])
+        tasks = await self.loop.run_in_executor(None, self.store.search_tasks, text, None, limit)
+        return 200, {"tasks": [{"id": task_id, "task": task, "finished": bool(finished), "date": date}
+                               for task_id, task, finished, date, rank, source in tasks]}
+
+    async def get_stats(self, query, body):
+        return 200, {
+            "sessions": len(self.sessions),
+            "subscribers": sum(len(session.subscriptions) for session in self.sessions.values()),
+            "updates_sent": self.updates_sent,
+            "subscribers_dropped": self.subscribers_dropped,
+            "cpu_seconds": time.process_time(),
+            "uptime_seconds": time.monotonic() - self.started_at,
+            "write_queue_depth": self.store.writer.queue.qsize(),
+            "write_queue_max_depth": self.store.writer.max_depth,
+            "write_queue_max_flush_seconds": self.store.writer.max_flush_seconds,
+        }
+
+    """HTTP
+
+    A connection can send several requests one after the other (keep-alive).
+    An event stream takes over the connection until the client closes it or
+    every session it follows has finished.
+    """
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                url = urllib.parse.urlsplit(target)
+                query = urllib.parse.parse_qs(url.query)
+
+                events_match = re.fullmatch(r"/sessions/(\d+)/events", url.path)
+                if method == "GET" and (events_match or url.path == "/events"):
+                    ids = [events_match.group(1)] if events_match else ",".join(query.get("ids", [])).split(",")
+                    await self.stream_events(reader, writer, ids)
+                    break
+
+                status, payload = await self.respond(method, url.path, query, body)
+                self.write_response(writer, status, payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, query, body):
+        path_found = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                path_found = True
+                if route_method == method:
+                    break
+        else:
+            return (405, {"error": "Method not allowed"}) if path_found else (404, {"error": "Not found"})
+
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HttpError(400, "Request body must be a JSON object")
+            return await handler(query, data, *match.groups())
+        except HttpError as error:
+            return error.status, {"error": error.message}
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {"error": str(error)}
+        except Exception as error:
+            print("{} {} failed:".format(method, path), file = self.errors)
+            traceback.print_exception(type(error), error, error.__traceback__, file = self.errors)
+            self.errors.flush()
+            return 500, {"error": "Internal server error"}
+
+    @staticmethod
+    def write_response(writer, status, payload):
+        body = json.dumps(payload).encode()
+        reason = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}.get(status, "")
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(status, reason, len(body)).encode() + body)
+
+    async def stream_events(self, reader, writer, session_ids):
+        sessions = [self.sessions.get(int(session_id)) for session_id in session_ids if session_id.isdigit()]
+        sessions = [session for session in sessions if session is not None]
+        if not sessions:
+            self.write_response(writer, 404, {"error": "No running session"})
+            await writer.drain()
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+        subscription = Subscription(writer, [session.id for session in sessions])
+        for session in sessions:
+            session.subscriptions.add(subscription)
+            #the current state right away, then one event per tick
+            now = self.loop.time()
+            writer.write("event: tick\ndata: {}\n\n".format(json.dumps(dict(session.to_dict(now), sent = time.time()))).encode())
+
+        closed = asyncio.ensure_future(reader.read())
+        done = asyncio.ensure_future(subscription.done.wait())
+        try:
+            await asyncio.wait([closed, done], return_when = asyncio.FIRST_COMPLETED)
+            await writer.drain()
+        finally:
+            closed.cancel()
+            done.cancel()
+            for session in sessions:
+                session.subscriptions.discard(subscription)
+
+    """Serve on a TCP port of localhost, or on a Unix socket if unix_path is given
+
+    Returns on SIGINT or SIGTERM, so the caller can close the store and commit
+    pending writes. On Windows, which has no signal handlers in asyncio, Ctrl+C
+    raises KeyboardInterrupt instead.
+    """
+
+    async def serve(self, host = "127.0.0.1", port = 8765, unix_path = None):
+        self.loop = asyncio.get_running_loop()
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path, backlog = 1024)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, backlog = 1024)
+
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(signal_number, stop.set)
+            except NotImplementedError:
+                pass
+
+        async with server:
+            print("Serving on", unix_path or "http://{}:{}".format(host, port), flush = True)
+            await stop.wait()
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Serve Pomodoro sessions over HTTP on localhost or a Unix socket")
+    parser.add_argument("--host", default = "127.0.0.1", help = "address to listen on")
+    parser.add_argument("--port", type = int, default = 8765, help = "TCP port to listen on")
+    parser.add_argument("--unix", help = "listen on this Unix socket instead of TCP")
+    parser.add_argument("--database", default = "pomodoro.db", help = "database file")
+    args = parser.parse_args()
+
+    store = TaskStore(Database(args.database))
+    service = PomodoroService(store)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
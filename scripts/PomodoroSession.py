@@ -0,0 +1,194 @@
+"""Pomodoro Session
+
+This script holds the session logic of the Pomodoro timer app, without any GUI.
+A session counts down 25 minutes for one task at a time and moves between the
+following states:
+
+    "idle" -- start() --> "running" -- pause() --> "paused" -- resume() --> "running"
+    "running" or "paused" -- finish_early(), or 25 minutes elapsed --> "idle"
+
+Starting a session checks the task name and logs the task through a TaskStore.
+The countdown runs in a CountingThread. The listener (for example the Timer
+window) must provide method implementation for update_time_remaining() and
+finish(); both are called from the CountingThread.
+
+The time is read from a clock object (see Clock.py), the real time by default.
+Simulation.py runs sessions on a SimulatedClock instead.
+
+With a SessionJournal (see SessionJournal.py), every state change is recorded
+in it, and recover() restores the countdown of a session the app did not end,
+after a crash for example.
+"""
+
+import datetime
+from CountingThread import CountingThread
+from Clock import SystemClock
+
+class SessionError(Exception):
+    """Raised when a session can not be started. Holds a title and a message for the user."""
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+
+class PomodoroSession():
+
+    DURATION = datetime.timedelta(minutes = 25)
+
+    def __init__(self, store, listener, clock = None, journal = None):
+        self.store = store
+        self.listener = listener
+        self.clock = clock or SystemClock()
+        self.journal = journal
+        self.journal_number = None
+
+        #CountingThread of the latest session, kept once it has ended, so a GUI can tell when it stops posting
+        self.thread = None
+
+        self.state = "idle"
+        self.task_name = None
+        self.task_started_time = None
+        self.task_finished_early = False
+
+    """Start the countdown for a task
+
+    This app does not allow empty or duplicate task to be entered, so SessionError
+    is raised in either cases. Otherwise the task is logged in the database and a
+    new CountingThread object ("worker") starts counting down.
+
+    Leading and trailing whitespace is removed from the name, and the duplicate
+    check ignores case and extra whitespace (see TaskNameIndex.py).
+    """
+
+    def start(self, task_name):
+        if self.state != "idle":
+            raise SessionError("Session Running", "A task is already running")
+
+        task_name = task_name.strip()
+        if not task_name:
+            raise SessionError("No Task", "Please enter a task name")
+
+        started_time = self.clock.now()
+        if self.store.task_is_duplicate(task_name, started_time.date()):
+            raise SessionError("Task Duplicate", "You have already performed this task today. Please enter a different task name")
+
+        self.task_name = task_name
+        self.task_started_time = started_time
+        self.task_finished_early = False
+        self.store.add_new_task(self.task_name, self.task_started_time)
+
+        end_time = self.task_started_time + PomodoroSession.DURATION
+        if self.journal is not None:
+            self.journal_number = self.journal.start(self.task_name, self.task_started_time, end_time)
+
+        self.worker = self.thread = CountingThread(self, self.task_started_time, end_time, self.clock)
+        self.state = "running"
+        self.worker.start()       #starts the thread
+
+    """Restore the session the journal holds as not ended, if any, and return True if there was one
+
+    The task row is added again if its insert was lost in the crash. The
+    countdown goes on from the end time last recorded, so the time the app was
+    not running counts as time worked, unless the session was paused: then it
+    stays paused, and resume() adds the time since it was paused. If the end
+    time has passed, the task is finished right away.
+
+    Only the latest session is restored; any older one left in the journal is
+    ended as force quit.
+    """
+
+    def recover(self):
+        if self.journal is None or self.state != "idle":
+            return False
+        sessions = self.journal.live_sessions()
+        if not sessions:
+            return False
+
+        for session in sessions[:-1]:
+            self.journal.force_quit(session.number, self.clock.now())
+        session = sessions[-1]
+
+        self.task_name = session.task_name
+        self.task_started_time = session.started_time
+        self.task_finished_early = False
+        self.journal_number = session.number
+        self.store.add_new_task(self.task_name, self.task_started_time, unique = True)
+
+        self.worker = self.thread = CountingThread(self, self.task_started_time, session.end_time, self.clock)
+        if session.paused_time is not None:
+            self.worker.paused = True
+            self.worker.start_time = session.paused_time
+            self.state = "paused"
+        else:
+            self.state = "running"
+        self.worker.start()
+        return True
+
+    """Pause and resume the countdown. The paused time is added to the end time by the worker."""
+
+    def pause(self):
+        if self.state == "running":
+            self.state = "paused"
+            self.worker.pause()
+            if self.journal_number is not None:
+                self.journal.pause(self.journal_number, self.worker.start_time)
+
+    def resume(self):
+        if self.state == "paused":
+            self.state = "running"
+            self.worker.resume()
+            if self.journal_number is not None:
+                self.journal.resume(self.journal_number, self.clock.now(), self.worker.end_time)
+
+    """End the session now. The task stays logged as not finished."""
+
+    def finish_early(self):
+        if self.state in ("running", "paused"):
+            self.task_finished_early = True
+            self.worker.finish_now()
+
+    """Stop the countdown without finishing the task, for example when the app is closed
+
+    The worker deletes itself from this object once it has stopped, so
+    is_stopped() tells when it is safe to exit.
+    """
+
+    def force_quit(self):
+        number, self.journal_number = self.journal_number, None
+        if number is not None:
+            self.journal.force_quit(number, self.clock.now())
+        if hasattr(self, "worker"):
+            if self.worker.is_alive():
+                self.worker.stop()
+            else:
+                del self.worker
+        self.state = "idle"
+
+    def is_stopped(self):
+        return not hasattr(self, "worker")
+
+    """Called by the CountingThread object with the remaining time, for example: "24:59" """
+
+    def update_time_remaining(self, time_string):
+        self.listener.update_time_remaining(time_string)
+
+    """Called by the CountingThread object when the 25 minutes elapsed or finish_early() was called
+
+    If the full 25 minutes was used for a task, the task is marked as finished
+    in the database. The session goes back to "idle" and the listener is told.
+    """
+
+    def finish(self):
+        if not self.task_finished_early:
+            self.store.mark_finished_task(self.task_name, self.task_started_time)
+        number, self.journal_number = self.journal_number, None
+        if number is not None:
+            if self.task_finished_early:
+                self.journal.finish_early(number, self.clock.now())
+            else:
+                self.journal.finish(number, self.clock.now())
+
+        del self.worker
+        self.state = "idle"
+        self.listener.finish()
@@ -0,0 +1,156 @@
+"""Schema
+
+This script holds the versioned schema of the pomodoro database. The version of
+a database file is stored in its "user_version" pragma. On startup, upgrade()
+runs every migration newer than that version, in order, so existing database
+files are upgraded in place.
+
+To change the schema, append a new function to MIGRATIONS. Never edit a
+migration that has already been released.
+"""
+
+"""Version 1: integer primary key, derived day key and (day, task) index
+
+Version 0 is the original "pomodoro (task text, finished integer, date text)"
+table without any index. The date column keeps the full start time as ISO text
+("2020-12-20 20:46:54.584119"), which sorts in time order, and the new day
+column ("2020-12-20") lets lookups by date use equality instead of LIKE.
+"""
+
+def _version_1(conn):
+    legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pomodoro'").fetchone()
+    if legacy:
+        conn.execute("ALTER TABLE pomodoro RENAME TO pomodoro_legacy")
+
+    conn.execute("""CREATE TABLE pomodoro (
+                        id INTEGER PRIMARY KEY,
+                        task TEXT NOT NULL,
+                        finished INTEGER NOT NULL DEFAULT 0,
+                        date TEXT NOT NULL,
+                        day TEXT NOT NULL)""")
+
+    if legacy:
+        conn.execute("""INSERT INTO pomodoro (task, finished, date, day)
+                        SELECT task, finished, date, substr(date, 1, 10)
+                        FROM pomodoro_legacy ORDER BY date""")
+        conn.execute("DROP TABLE pomodoro_legacy")
+
+    #covers get_tasks_by_date(), task_is_duplicate() and delete_task() without touching the table
+    conn.execute("CREATE INDEX pomodoro_day_task ON pomodoro (day, task, finished, date)")
+
+"""Version 2: daily_summary table kept up to date by triggers
+
+One row per day with the number of tasks started and the number finished with
+the full 25 minutes. Triggers on the pomodoro table update the row of the day
+on every insert, update and delete, so statistics never scan the task log.
+"""
+
+def _version_2(conn):
+    conn.execute("""CREATE TABLE daily_summary (
+                        day TEXT PRIMARY KEY,
+                        started INTEGER NOT NULL DEFAULT 0,
+                        finished INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID""")
+
+    conn.execute("""INSERT INTO daily_summary (day, started, finished)
+                    SELECT day, count(*), sum(finished) FROM pomodoro GROUP BY day""")
+
+    _create_daily_summary_triggers(conn)
+
+def _create_daily_summary_triggers(conn):
+    conn.execute("""CREATE TRIGGER daily_summary_insert AFTER INSERT ON pomodoro BEGIN
+                        INSERT INTO daily_summary (day, started, finished) VALUES (NEW.day, 1, NEW.finished)
+                        ON CONFLICT (day) DO UPDATE SET started = started + 1, finished = finished + NEW.finished;
+                    END""")
+
+    conn.execute("""CREATE TRIGGER daily_summary_update AFTER UPDATE OF finished, day ON pomodoro BEGIN
+                        UPDATE daily_summary SET started = started - 1, finished = finished - OLD.finished WHERE day = OLD.day;
+                        INSERT INTO daily_summary (day, started, finished) VALUES (NEW.day, 1, NEW.finished)
+                        ON CONFLICT (day) DO UPDATE SET started = started + 1, finished = finished + NEW.finished;
+                        DELETE FROM daily_summary WHERE day = OLD.day AND started = 0;
+                    END""")
+
+    conn.execute("""CREATE TRIGGER daily_summary_delete AFTER DELETE ON pomodoro BEGIN
+                        UPDATE daily_summary SET started = started - 1, finished = finished - OLD.finished WHERE day = OLD.day;
+                        DELETE FROM daily_summary WHERE day = OLD.day AND started = 0;
+                    END""")
+
+"""Version 3: full-text index of task names
+
+task_search is an FTS5 table over pomodoro.task that stores only the index,
+not a copy of the names (content = 'pomodoro'), and its rowid is the id of the
+task. Prefix indexes of 1 to 4 characters let a name be searched while it is
+being typed. Triggers add, remove and replace index entries on every insert,
+delete and rename, and the index is built from the existing tasks here.
+"""
+
+def _version_3(conn):
+    conn.execute("""CREATE VIRTUAL TABLE task_search USING fts5(
+                        task, content = 'pomodoro', content_rowid = 'id', prefix = '1 2 3 4')""")
+
+    conn.execute("INSERT INTO task_search (task_search) VALUES ('rebuild')")
+
+    _create_task_search_triggers(conn)
+
+def _create_task_search_triggers(conn):
+    conn.execute("""CREATE TRIGGER task_search_insert AFTER INSERT ON pomodoro BEGIN
+                        INSERT INTO task_search (rowid, task) VALUES (NEW.id, NEW.task);
+                    END""")
+
+    conn.execute("""CREATE TRIGGER task_search_update AFTER UPDATE OF task ON pomodoro BEGIN
+                        INSERT INTO task_search (task_search, rowid, task) VALUES ('delete', OLD.id, OLD.task);
+                        INSERT INTO task_search (rowid, task) VALUES (NEW.id, NEW.task);
+                    END""")
+
+    conn.execute("""CREATE TRIGGER task_search_delete AFTER DELETE ON pomodoro BEGIN
+                        INSERT INTO task_search (task_search, rowid, task) VALUES ('delete', OLD.id, OLD.task);
+                    END""")
+
+"""Version 4: ids never reused, and the tables of the monthly archives
+
+Old months are moved to archive files (see Archive.py) and a task keeps its id
+there, so ids must stay unique across the database and its archives even once
+the rows with the highest ids have been moved out. The pomodoro table is
+rebuilt with AUTOINCREMENT, keeping every id, and its indexes and triggers are
+created again. task_search refers to the table by name and is left as it is.
+
+"archive" lists the archived months with the range of ids each one holds, and
+"archived_summary" keeps the daily_summary rows of archived days, so the list
+of dates and the statistics are read without opening any archive.
+"""
+
+def _version_4(conn):
+    conn.execute("""CREATE TABLE pomodoro_autoincrement (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        task TEXT NOT NULL,
+                        finished INTEGER NOT NULL DEFAULT 0,
+                        date TEXT NOT NULL,
+                        day TEXT NOT NULL)""")
+
+    conn.execute("""INSERT INTO pomodoro_autoincrement (id, task, finished, date, day)
+                    SELECT id, task, finished, date, day FROM pomodoro ORDER BY id""")
+    conn.execute("DROP TABLE pomodoro")
+    conn.execute("ALTER TABLE pomodoro_autoincrement RENAME TO pomodoro")
+
+    conn.execute("CREATE INDEX pomodoro_day_task ON pomodoro (day, task, finished, date)")
+    _create_daily_summary_triggers(conn)
+    _create_task_search_triggers(conn)
+
+    conn.execute("""CREATE TABLE archive (
+                        month TEXT PRIMARY KEY,
+                        first_id INTEGER NOT NULL,
+                        last_id INTEGER NOT NULL) WITHOUT ROWID""")
+
+    conn.execute("""CREATE TABLE archived_summary (
+                        day TEXT PRIMARY KEY,
+                        started INTEGER NOT NULL DEFAULT 0,
+                        finished INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID""")
+
+MIGRATIONS = [_version_1, _version_2, _version_3, _version_4]
+
+def upgrade(conn):
+    """Run every migration newer than the database's version inside one transaction"""
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start = version + 1):
+        migration(conn)
+        conn.execute("PRAGMA user_version = {:d}".format(number))
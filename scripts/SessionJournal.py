@@ -0,0 +1,241 @@
+"""Session Journal
+
+This script keeps an append-only journal of session events (start, pause,
+resume, finish, finish early, force quit) in a small binary file next to the
+database, so a countdown that was running when the app crashed or was killed
+can be restored when it starts again. The database only holds the task row;
+the end time, shifted by pauses, and the pause state are in the journal.
+
+Every event is one record:
+
+    type (1 byte), session number (4), time (8), payload length (2), payload, crc32 (4)
+
+with times in microseconds since 1970-01-01 in local time, the same naive
+datetimes the app uses. A start carries the end time and the task name, and a
+resume carries the new end time. The crc32 marks a record torn by a crash,
+which ends the journal when it is read.
+
+Appending an event only packs it into the file buffer, which takes a few
+microseconds. A flusher thread writes the buffer and calls fsync() every
+FLUSH_INTERVAL seconds if anything was appended (group commit), so a crash
+loses at most the events of the last interval.
+
+The journal only needs the events of sessions that have not ended. Once it
+grows past COMPACT_BYTES, the flusher rewrites it with only those events.
+"""
+
+import datetime
+import os
+import struct
+import threading
+import zlib
+
+class JournaledSession():
+    """State of a session rebuilt from its events. paused_time is None unless it is paused."""
+
+    __slots__ = ("number", "task_name", "started_time", "end_time", "paused_time", "records")
+
+    def __init__(self, number, task_name, started_time, end_time):
+        self.number = number
+        self.task_name = task_name
+        self.started_time = started_time
+        self.end_time = end_time
+        self.paused_time = None
+
+        #encoded events of the session, written again by compaction
+        self.records = []
+
+class SessionJournal():
+
+    #seconds between two group commits
+    FLUSH_INTERVAL = 0.05
+
+    #size the journal is compacted at
+    COMPACT_BYTES = 64 * 1024
+
+    START, PAUSE, RESUME, FINISH, FINISH_EARLY, FORCE_QUIT = range(1, 7)
+
+    #events after which the session is over
+    ENDS = (FINISH, FINISH_EARLY, FORCE_QUIT)
+
+    HEADER = struct.Struct("<BIqH")
+    TIME = struct.Struct("<q")
+    CRC = struct.Struct("<I")
+
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    """Open the journal at "path", read the sessions that had not ended, and start the flusher
+
+    A torn record at the end, left by a crash, is cut off. The journal is then
+    compacted, so it starts with only the sessions to restore.
+    """
+
+    def __init__(self, path, flush_interval = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+
+        #sessions that have not ended, by number
+        self.live = {}
+        self.next_number = 1
+
+        self.replay()
+        self.file = None
+        self.compact()
+
+        self.dirty = False
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target = self.flush_loop, daemon = True)
+        self.flusher.start()
+
+    """Return the sessions that had not ended, oldest first"""
+
+    def live_sessions(self):
+        with self.lock:
+            return sorted(self.live.values(), key = lambda session: session.number)
+
+    """Record session events. start() returns the number the other events of the session take."""
+
+    def start(self, task_name, started_time, end_time):
+        with self.lock:
+            number = self.next_number
+            self.next_number += 1
+            payload = SessionJournal.TIME.pack(self.to_micros(end_time)) + task_name.encode("utf-8")
+            self.append(SessionJournal.START, number, started_time, payload)
+            return number
+
+    def pause(self, number, time):
+        with self.lock:
+            self.append(SessionJournal.PAUSE, number, time)
+
+    def resume(self, number, time, end_time):
+        with self.lock:
+            self.append(SessionJournal.RESUME, number, time, SessionJournal.TIME.pack(self.to_micros(end_time)))
+
+    def finish(self, number, time):
+        with self.lock:
+            self.append(SessionJournal.FINISH, number, time)
+
+    def finish_early(self, number, time):
+        with self.lock:
+            self.append(SessionJournal.FINISH_EARLY, number, time)
+
+    def force_quit(self, number, time):
+        with self.lock:
+            self.append(SessionJournal.FORCE_QUIT, number, time)
+
+    """Write every event appended so far to disk now, without waiting for the flusher"""
+
+    def sync(self):
+        with self.lock:
+            self.file.flush()
+            self.dirty = False
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.closed.set()
+        self.flusher.join()
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    """Encode an event, apply it to the live sessions and add it to the file buffer, with the lock held
+
+    Events of sessions that are not live (already ended) are ignored.
+    """
+
+    def append(self, event_type, number, time, payload = b""):
+        record = SessionJournal.HEADER.pack(event_type, number, self.to_micros(time), len(payload)) + payload
+        record += SessionJournal.CRC.pack(zlib.crc32(record))
+        if self.apply(event_type, number, time, payload, record):
+            self.file.write(record)
+            self.dirty = True
+
+    def apply(self, event_type, number, time, payload, record):
+        if event_type == SessionJournal.START:
+            end_time = self.from_micros(SessionJournal.TIME.unpack_from(payload)[0])
+            session = self.live[number] = JournaledSession(number, payload[SessionJournal.TIME.size:].decode("utf-8"), time, end_time)
+            self.next_number = max(self.next_number, number + 1)
+        else:
+            session = self.live.get(number)
+            if session is None:
+                return False
+            if event_type in SessionJournal.ENDS:
+                del self.live[number]
+                return True
+            if event_type == SessionJournal.PAUSE:
+                session.paused_time = time
+            elif event_type == SessionJournal.RESUME:
+                session.paused_time = None
+                session.end_time = self.from_micros(SessionJournal.TIME.unpack_from(payload)[0])
+        session.records.append(record)
+        return True
+
+    """Read the journal file into the live sessions, cutting it at the first torn record"""
+
+    def replay(self):
+        try:
+            with open(self.path, "rb") as journal_file:
+                data = journal_file.read()
+        except FileNotFoundError:
+            return
+
+        offset = 0
+        while offset + SessionJournal.HEADER.size <= len(data):
+            event_type, number, micros, length = SessionJournal.HEADER.unpack_from(data, offset)
+            end = offset + SessionJournal.HEADER.size + length
+            if end + SessionJournal.CRC.size > len(data):
+                break
+            if SessionJournal.CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end]):
+                break
+            payload = data[offset + SessionJournal.HEADER.size:end]
+            self.apply(event_type, number, self.from_micros(micros), payload, data[offset:end + SessionJournal.CRC.size])
+            offset = end + SessionJournal.CRC.size
+
+    """Rewrite the journal with only the events of the live sessions
+
+    The new journal is written and synced next to the old one, then replaces it,
+    so a crash during compaction leaves one or the other whole.
+    """
+
+    def compact(self):
+        with self.lock:
+            records = [record for session in sorted(self.live.values(), key = lambda session: session.number)
+                       for record in session.records]
+            with open(self.path + ".tmp", "wb") as compacted:
+                compacted.write(b"".join(records))
+                compacted.flush()
+                os.fsync(compacted.fileno())
+
+            if self.file is not None:
+                self.file.close()
+            os.replace(self.path + ".tmp", self.path)
+            self.file = open(self.path, "ab")
+
+    """Group commit: every FLUSH_INTERVAL, write and sync what was appended since the last time
+
+    The file buffer is written with the lock held, which is a copy to the
+    operating system; the fsync() is done without it, so events can be appended
+    while the disk syncs.
+    """
+
+    def flush_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            with self.lock:
+                if not self.dirty:
+                    continue
+                self.file.flush()
+                self.dirty = False
+                file_number, size = self.file.fileno(), self.file.tell()
+            os.fsync(file_number)
+            if size > SessionJournal.COMPACT_BYTES:
+                self.compact()
+
+    @staticmethod
+    def to_micros(time):
+        return (time - SessionJournal.EPOCH) // datetime.timedelta(microseconds = 1)
+
+    @staticmethod
+    def from_micros(micros):
+        return SessionJournal.EPOCH + datetime.timedelta(microseconds = micros)
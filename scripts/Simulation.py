@@ -0,0 +1,184 @@
+"""Simulation
+
+This script replays scripted Pomodoro sessions on a SimulatedClock (see
+Clock.py), through the same PomodoroSession, CountingThread and TaskStore the
+app uses, so the tasks it logs are the rows the app would log at those times.
+A year of sessions runs in seconds instead of a year.
+
+A script is a list of steps, each a tuple:
+
+    ("start", task_name)    start a session, as the Start button
+    ("wait", seconds)       let the virtual time pass
+    ("wait_until", time)    let the virtual time pass until a datetime
+    ("wait_finished",)      wait until the session ends
+    ("pause",)              pause the session
+    ("resume",)             resume the session
+    ("finish_early",)       end the session before 25 minutes
+    ("force_quit",)         stop the session as if the app was closed
+
+for example: [("start", "Write report"), ("wait", 600), ("pause",),
+("wait", 90.5), ("resume",), ("wait_finished",)]. random_script() makes the
+script of days of usage:
+
+    python Simulation.py --days 365 --sessions-per-day 10 --database simulated.db
+
+Without --database, the tasks are logged in a temporary database.
+"""
+
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+from Clock import SimulatedClock
+from PomodoroSession import PomodoroSession, SessionError
+
+class Simulation():
+
+    def __init__(self, store, clock):
+        self.store = store
+        self.clock = clock
+        self.session = PomodoroSession(store, self, clock)
+
+        #notified through the clock when the session ends
+        self.session_ended = threading.Condition()
+
+        #step counts, for the report
+        self.ticks = 0
+        self.sessions_started = 0
+        self.sessions_ended = 0
+        self.sessions_rejected = 0
+
+    """Run the steps of a script in order, on the calling thread
+
+    Sessions refused by PomodoroSession (duplicate or empty task name, or a
+    session already running) are counted in sessions_rejected. The script should
+    end with no session running, for example with ("wait_finished",).
+    """
+
+    def run(self, script):
+        self.clock.add_thread()
+        try:
+            for step in script:
+                getattr(self, "step_" + step[0])(*step[1:])
+        finally:
+            self.clock.remove_thread()
+
+    def step_start(self, task_name):
+        try:
+            self.session.start(task_name)
+        except SessionError:
+            self.sessions_rejected += 1
+            return
+        self.sessions_started += 1
+
+    def step_wait(self, seconds):
+        self.clock.sleep(seconds)
+
+    def step_wait_until(self, time):
+        seconds = (time - self.clock.now()).total_seconds()
+        if seconds > 0:
+            self.clock.sleep(seconds)
+
+    def step_wait_finished(self):
+        with self.session_ended:
+            while self.session.state != "idle":
+                self.clock.wait(self.session_ended)
+
+    def step_pause(self):
+        self.session.pause()
+
+    def step_resume(self):
+        self.session.resume()
+
+    def step_finish_early(self):
+        self.session.finish_early()
+
+    """Stop the session and wait for its CountingThread to end, as the Timer window does on close"""
+
+    def step_force_quit(self):
+        worker = getattr(self.session, "worker", None)
+        self.session.force_quit()
+        if worker is not None:
+            worker.join()
+
+    """Listener methods, called by the session from its CountingThread"""
+
+    def update_time_remaining(self, time_string):
+        self.ticks += 1
+
+    def finish(self):
+        with self.session_ended:
+            self.sessions_ended += 1
+            self.clock.notify(self.session_ended)
+
+"""Return the script of "days" days of usage, starting on the day of "start"
+
+Every day has sessions_per_day sessions from 9:00 (or as soon as those of the
+day before are over), with a short break between them. A session is paused
+once or twice for a random time (fractions of a second included) in one case
+out of three, finished early in one case out of five, and force quit (the app
+closed) in one case out of fifty. The other sessions run their full 25
+minutes. The same seed gives the same script.
+"""
+
+def random_script(days, sessions_per_day, start, seed = 0):
+    rng = random.Random(seed)
+    script = []
+    day_start = datetime.datetime.combine(start.date(), datetime.time(9))
+
+    for day in range(days):
+        script.append(("wait_until", day_start))
+
+        for number in range(sessions_per_day):
+            script.append(("start", "Task {} of {}".format(number + 1, day_start.date())))
+
+            if rng.random() < 1 / 3:
+                for _ in range(rng.randint(1, 2)):
+                    script += [("wait", rng.uniform(0, 600)), ("pause",), ("wait", round(rng.uniform(0.1, 300), 3)), ("resume",)]
+
+            choice = rng.random()
+            if choice < 1 / 50:
+                script += [("wait", rng.uniform(0, 300)), ("force_quit",)]
+            elif choice < 1 / 50 + 1 / 5:
+                script += [("wait", rng.uniform(0, 300)), ("finish_early",), ("wait_finished",)]
+            else:
+                script.append(("wait_finished",))
+            script.append(("wait", 300))
+
+        day_start += datetime.timedelta(days = 1)
+    return script
+
+if __name__ == "__main__":
+
+    from Database import Database
+    from TaskStore import TaskStore
+
+    parser = argparse.ArgumentParser(description = "Replay days of Pomodoro sessions on a simulated clock")
+    parser.add_argument("--days", type = int, default = 365, help = "number of days of usage")
+    parser.add_argument("--sessions-per-day", type = int, default = 10, help = "sessions started every day")
+    parser.add_argument("--start", default = "2020-01-01", help = "first day, YYYY-MM-DD")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the random script")
+    parser.add_argument("--database", help = "database file the tasks are logged in")
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    start = datetime.datetime.combine(datetime.date.fromisoformat(args.start), datetime.time(9))
+    clock = SimulatedClock(start)
+    store = TaskStore(Database(args.database or os.path.join(directory.name, "simulated.db")), keep_months = None)
+    simulation = Simulation(store, clock)
+    script = random_script(args.days, args.sessions_per_day, start, args.seed)
+
+    wall_start = time.perf_counter()
+    simulation.run(script)
+    store.writer.flush()
+    wall_seconds = time.perf_counter() - wall_start
+
+    days, started, finished = store.get_summary_totals()
+    print("{} steps, {} sessions in {:.2f} s of real time, simulated until {}".format(
+        len(script), simulation.sessions_started, wall_seconds, clock.now().isoformat(" ", "seconds")))
+    print("{} tasks logged over {} days, {} finished".format(started, days, finished))
+    store.close()
+    directory.cleanup()
@@ -0,0 +1,222 @@
+"""Task History
+
+This script exports the task log of the Pomodoro timer app to a CSV or JSON
+Lines file, and imports such a file back into a database. Files ending in ".gz"
+are compressed with gzip.
+
+Both directions stream: the export reads the database in chunks with
+fetchmany() and the import inserts rows in batches, one transaction per batch,
+so memory stays constant however many tasks there are. The export includes the
+tasks of the database's monthly archives (see Archive.py), oldest month first.
+Imported tasks go into the database and are archived the next time the app
+starts.
+
+An imported task is skipped if a task with the same name already exists on the
+same day, in the database or in the archive of its month, the same rule the app
+uses to refuse duplicate tasks: names are compared ignoring case and extra
+whitespace. Rows that can not be read (missing columns, empty name, finished
+not 0 or 1, date not in ISO format) are skipped and reported.
+
+    python TaskHistory.py export history.csv.gz
+    python TaskHistory.py import history.csv.gz --database other.db
+"""
+
+import argparse
+import csv
+import datetime
+import gzip
+import itertools
+import json
+import sys
+import time
+from Database import Database
+from Archive import Archives
+from TaskNameIndex import normalize
+
+FIELDS = ("task", "finished", "date")
+
+#accepted values of the finished column, from CSV (text) or JSON (numbers)
+FINISHED_VALUES = {"0": 0, "1": 1, 0: 0, 1: 1}
+
+#rows read from the database per fetchmany() call and written per transaction on import
+CHUNK_SIZE = 10000
+
+"""Open a file for text reading or writing, through gzip if its name ends in ".gz" """
+
+def open_file(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", compresslevel = 6, encoding = "utf-8", newline = "")
+    return open(path, mode, encoding = "utf-8", newline = "")
+
+"""Return "csv" or "jsonl" from the file name, for example "history.jsonl.gz" -> "jsonl" """
+
+def file_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith(".jsonl") or name.endswith(".json"):
+        return "jsonl"
+    raise ValueError("Unknown file format for " + path + ", use a .csv or .jsonl file name or --format")
+
+"""Export every task, oldest first, and return the number of tasks written"""
+
+def export_history(database, path, output_format = None):
+    output_format = output_format or file_format(path)
+    export_sql = "SELECT task, finished, date FROM {}.pomodoro ORDER BY id"
+
+    archives = Archives(database)
+
+    def all_rows():
+        for month in sorted(archives.months):
+            yield from database.streamQuery(export_sql.format(archives.attach(month)), None, CHUNK_SIZE)
+        yield from database.streamQuery(export_sql.format("main"), None, CHUNK_SIZE)
+
+    rows = all_rows()
+    count = 0
+
+    with open_file(path, "w") as output_file:
+        if output_format == "csv":
+            writer = csv.writer(output_file)
+            writer.writerow(FIELDS)
+            for chunk in iter(lambda: list(itertools.islice(rows, CHUNK_SIZE)), []):
+                writer.writerows(chunk)
+                count += len(chunk)
+        else:
+            #only the task name needs escaping, the other fields are numbers and ISO dates
+            line = '{{"task": {}, "finished": {}, "date": "{}"}}\n'.format
+            for chunk in iter(lambda: list(itertools.islice(rows, CHUNK_SIZE)), []):
+                output_file.writelines([line(json.dumps(task, ensure_ascii = False), finished, date) for task, finished, date in chunk])
+                count += len(chunk)
+    return count
+
+"""Yield (line number, task, finished, date, problem) for every row of an export file
+
+"problem" is None, or says why a row can not be read at all (too few columns,
+not a JSON object), in which case the values are None. Such a row is reported
+and skipped like any other invalid row.
+"""
+
+def read_rows(input_file, input_format):
+    missing = "missing {} (expected " + ", ".join(FIELDS) + ")"
+    if input_format == "csv":
+        reader = csv.reader(input_file)
+        header = next(reader, [])
+        try:
+            columns = [header.index(field) for field in FIELDS]
+        except ValueError:
+            raise ValueError("CSV header must have the columns " + ", ".join(FIELDS))
+        for line_number, row in enumerate(reader, start = 2):
+            if len(row) <= max(columns):
+                yield line_number, None, None, None, missing.format("columns")
+            else:
+                yield (line_number,) + tuple(row[column] for column in columns) + (None,)
+    else:
+        for line_number, line in enumerate(input_file, start = 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    #JSONDecodeError is a ValueError
+                    yield line_number, None, None, None, "not valid JSON"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, None, None, "not a JSON object"
+                elif not all(field in row for field in FIELDS):
+                    yield line_number, None, None, None, missing.format("fields")
+                else:
+                    yield (line_number,) + tuple(row[field] for field in FIELDS) + (None,)
+
+"""Check a row and return the values to insert: (task, finished, date, day)
+
+Raises ValueError with the reason if the row is not valid.
+"""
+
+def validate_row(task, finished, date):
+    if not isinstance(task, str) or not task.strip():
+        raise ValueError("empty task name")
+    if finished not in FINISHED_VALUES:
+        raise ValueError("finished must be 0 or 1, not " + repr(finished))
+    started = datetime.datetime.fromisoformat(date)
+    #dates exported by this app are already in the stored format and are kept as they are
+    if date[10:11] != " " or len(date) not in (19, 26):
+        date = started.isoformat(" ")
+    return (task, FINISHED_VALUES[finished], date, date[:10])
+
+"""Import every valid row of an export file and return counts of what happened
+
+A row is inserted only if no task with the same name exists on the same day,
+which is checked with the (day, task) index and normalize_task_name() (see
+Database.py) inside the insert itself, so rows repeated within the file are
+caught too. Rows of archived months are also checked against the archive of
+their month, attached for them; those of a chunk are inserted in one
+transaction per month.
+"""
+
+def import_history(database, path, input_format = None, errors = sys.stderr, max_errors_shown = 10):
+    input_format = input_format or file_format(path)
+    insert_sql = """INSERT INTO main.pomodoro (task, finished, date, day) SELECT ?, ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM main.pomodoro WHERE day = ? AND normalize_task_name(task) = ?)"""
+    archived_insert_sql = insert_sql + " AND NOT EXISTS (SELECT 1 FROM {}.pomodoro WHERE day = ? AND normalize_task_name(task) = ?)"
+    archives = Archives(database)
+    counts = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+
+    def valid_rows(rows):
+        for line_number, task, finished, date, problem in rows:
+            counts["read"] += 1
+            try:
+                if problem is not None:
+                    raise ValueError(problem)
+                task, finished, date, day = validate_row(task, finished, date)
+            except (ValueError, TypeError, KeyError) as error:
+                counts["invalid"] += 1
+                if counts["invalid"] <= max_errors_shown:
+                    print("{}:{}: skipped, {}".format(path, line_number, error), file = errors)
+                continue
+            yield (task, finished, date, day, day, normalize(task))
+
+    with open_file(path, "r") as input_file:
+        rows = valid_rows(read_rows(input_file, input_format))
+        for chunk in iter(lambda: list(itertools.islice(rows, CHUNK_SIZE)), []):
+            #rows by archived month, None for the months in the database
+            months = {}
+            for row in chunk:
+                months.setdefault(row[3][:7] if archives.is_archived(row[3]) else None, []).append(row)
+
+            for month, month_rows in months.items():
+                if month is None:
+                    sql = insert_sql
+                else:
+                    sql = archived_insert_sql.format(archives.attach(month))
+                    month_rows = [row + row[4:] for row in month_rows]
+                with database.transaction() as conn:
+                    #rowcount adds up the rows inserted by each execution, without trigger changes
+                    inserted = conn.executemany(sql, month_rows).rowcount
+                counts["inserted"] += inserted
+                counts["duplicates"] += len(month_rows) - inserted
+    return counts
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Export or import the task history of the Pomodoro timer app")
+    parser.add_argument("command", choices = ("export", "import"))
+    parser.add_argument("file", help = "CSV or JSON Lines file, gzip compressed if the name ends in .gz")
+    parser.add_argument("--database", default = "pomodoro.db", help = "database file")
+    parser.add_argument("--format", choices = ("csv", "jsonl"), help = "file format, by default taken from the file name")
+    args = parser.parse_args()
+
+    database = Database(args.database)
+    database.migrate()
+    start = time.perf_counter()
+
+    if args.command == "export":
+        count = export_history(database, args.file, args.format)
+        result = {"exported": count}
+    else:
+        result = import_history(database, args.file, args.format)
+        count = result["read"]
+
+    seconds = time.perf_counter() - start
+    result["seconds"] = round(seconds, 3)
+    result["rows_per_second"] = round(count / seconds) if seconds else count
+    print(json.dumps(result))
+    database.close()
@@ -0,0 +1,166 @@
+"""Task Name Index
+
+This script keeps the names of the tasks of one day in memory, so the
+duplicate check made when a session starts, and again as the task name is
+typed, is a set lookup with no database read. It also keeps the names of
+recent tasks in sorted order, to complete a name as it is typed.
+
+Names are compared normalized: case is ignored and runs of whitespace count as
+one space, so "Write  report " is a duplicate of "write report".
+
+The index belongs to a TaskStore, which tells it of every task added and
+deleted. The day is read once, the first time it is asked about; asking about
+another day (after midnight for example) reads that day instead.
+"""
+
+import bisect
+import datetime
+import threading
+
+"""Return the form task names are compared in"""
+
+def normalize(task_name):
+    return " ".join(task_name.split()).casefold()
+
+class TaskNameIndex():
+
+    #days back the names offered by complete() come from, and how many at most.
+    #the database keeps at least the last 28 days with TaskStore.KEEP_MONTHS = 2, so no archive is read
+    RECENT_DAYS = 28
+    RECENT_NAMES = 5000
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+
+        #day indexed, task id -> normalized name of its tasks, and the count of each name
+        self.day = None
+        self.task_ids = {}
+        self.counts = {}
+
+        #names of tasks added but not yet committed, by day
+        self.pending = {}
+
+        #changes received while a day is being read, applied once it is read
+        self.loading_day = None
+        self.loading_changes = []
+
+        #(normalized, name) of recent tasks, sorted, one per normalized name
+        self.recent = []
+
+    """Return True if a task with the same normalized name was added on "day" """
+
+    def contains(self, task_name, day):
+        self.ensure_day(day)
+        name = normalize(task_name)
+        with self.lock:
+            return self.counts.get(name, 0) > 0 or self.pending.get((day.isoformat(), name), 0) > 0
+
+    """Return up to "limit" names of recent tasks starting with "prefix", without those already used on "day" """
+
+    def complete(self, prefix, day, limit = 10):
+        self.ensure_day(day)
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        names = []
+        with self.lock:
+            index = bisect.bisect_left(self.recent, (prefix, ""))
+            while index < len(self.recent) and self.recent[index][0].startswith(prefix) and len(names) < limit:
+                normalized, name = self.recent[index]
+                if self.counts.get(normalized, 0) == 0 and (day.isoformat(), normalized) not in self.pending:
+                    names.append(name)
+                index += 1
+        return names
+
+    """Read the tasks of "day" and the recent names, unless "day" is the day indexed
+
+    The store is read without the lock held, as reading waits for the write
+    queue, which calls on_store_changed(). Changes to the day committed while it
+    is read are kept and applied afterwards; as they are keyed by task id,
+    applying one the read already saw changes nothing.
+    """
+
+    def ensure_day(self, day):
+        with self.lock:
+            if day.isoformat() == self.day:
+                return
+            self.loading_day = day.isoformat()
+            self.loading_changes = []
+
+        tasks = self.store.get_tasks_by_date(day.isoformat())
+        since = day - datetime.timedelta(days = TaskNameIndex.RECENT_DAYS)
+        recent_names = self.store.get_recent_task_names(since, TaskNameIndex.RECENT_NAMES)
+
+        with self.lock:
+            self.day = day.isoformat()
+            self.task_ids, self.counts = {}, {}
+            for task_id, task_name, _, _ in tasks:
+                self.add_task(task_id, task_name)
+            for change, task_id, task_name in self.loading_changes:
+                if change == "added":
+                    self.add_task(task_id, task_name)
+                else:
+                    self.remove_task(task_id)
+            self.loading_day, self.loading_changes = None, []
+
+            #names come most recent first, so the latest spelling of a name is kept
+            recent = {}
+            for name in recent_names:
+                recent.setdefault(normalize(name), " ".join(name.split()))
+            self.recent = sorted(recent.items())
+
+    """Count a task added but not committed yet, so it is a duplicate already; called by TaskStore.add_new_task()"""
+
+    def add_pending(self, task_name, day):
+        key = (day, normalize(task_name))
+        with self.lock:
+            self.pending[key] = self.pending.get(key, 0) + 1
+
+    def remove_pending(self, task_name, day):
+        key = (day, normalize(task_name))
+        with self.lock:
+            self.pending[key] -= 1
+            if not self.pending[key]:
+                del self.pending[key]
+
+    """Called by the store after every committed write, see TaskStore.add_listener()"""
+
+    def on_store_changed(self, change, tasks):
+        if change == "finished":
+            return
+        with self.lock:
+            for task_id, task_name, _, task_date in tasks:
+                day = task_date[:10]
+                if day == self.loading_day:
+                    self.loading_changes.append((change, task_id, task_name))
+                if day == self.day:
+                    if change == "added":
+                        self.add_task(task_id, task_name)
+                    else:
+                        self.remove_task(task_id)
+                if change == "added":
+                    self.add_recent(task_name)
+
+    def add_recent(self, task_name):
+        name, task_name = normalize(task_name), " ".join(task_name.split())
+        index = bisect.bisect_left(self.recent, (name, ""))
+        if index < len(self.recent) and self.recent[index][0] == name:
+            self.recent[index] = (name, task_name)
+        else:
+            self.recent.insert(index, (name, task_name))
+
+    """Add and remove the tasks of the day indexed, with the lock held"""
+
+    def add_task(self, task_id, task_name):
+        if task_id not in self.task_ids:
+            name = self.task_ids[task_id] = normalize(task_name)
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def remove_task(self, task_id):
+        name = self.task_ids.pop(task_id, None)
+        if name is not None:
+            self.counts[name] -= 1
+            if not self.counts[name]:
+                del self.counts[name]
@@ -0,0 +1,516 @@
+"""Task Store
+
+This script is the storage layer of the Pomodoro timer app. It keeps the log of
+tasks in the sqlite3 database: adding a task when it starts, marking it finished
+after the full 25 minutes, deleting it, and the queries used by the log window
+and the duplicate task check.
+
+It does not depend on tkinter, so it can be used by the GUI, by scripts and by
+services alike. Writes go through a WriteQueue thread and return a Future.
+Reads that go to the database first wait for the pending writes of the days
+they read, so they always see earlier writes; other writes do not hold them up.
+
+The task lists of recently used days are kept in an LRU cache, which serves
+get_tasks_by_date() without reading the database. Each write updates the cached
+day it changed once it is committed. The names of the tasks of the current day
+are kept in a TaskNameIndex, which serves task_is_duplicate() and
+complete_task_name() from memory.
+
+When the store is opened, months older than the last KEEP_MONTHS are moved to
+monthly archive files (see Archive.py), in the background on the write queue.
+Reads of archived days and searches that reach back to them attach the archives
+they need, so every method returns the whole history while the database itself
+only holds the recent months.
+
+Windows and services that show tasks can subscribe with add_listener() to be
+told of every task added, finished or deleted once it is committed, instead of
+reading the database again.
+"""
+
+import datetime
+import concurrent.futures
+import threading
+from WriteQueue import WriteQueue
+from LruCache import LruCache
+from Archive import Archives
+from TaskNameIndex import TaskNameIndex, normalize
+
+class TaskStore():
+
+    #number of days kept in the cache
+    CACHED_DAYS = 64
+
+    #days with more tasks than this are never cached, only paged from the database
+    MAX_CACHED_DAY_TASKS = 2000
+
+    #number of most recent matches ranked by search_tasks()
+    SEARCH_LIMIT = 2000
+
+    #primary keys per statement in delete_tasks(), below the 999 variables older sqlite3 allows
+    DELETE_CHUNK_SIZE = 500
+
+    #months kept in the database, this month included. Older months are archived.
+    KEEP_MONTHS = 2
+
+    """Open the store on a Database object and create or upgrade its tables
+
+    Months older than the last keep_months are archived by the first write of
+    the write queue, so opening the store does not wait for it, and neither do
+    reads: until it is done, they may miss the tasks of the month being moved
+    (see rollover_pending()). keep_months = None leaves the database as it is.
+    """
+
+    def __init__(self, database, keep_months = KEEP_MONTHS):
+        self.database = database
+        self.database.migrate()
+        self.archives = Archives(database)
+        self.writer = WriteQueue(database)
+        self.writer.start()
+
+        #day -> number of task writes submitted and not yet applied to the cache, None for any day
+        self.pending_days = {}
+        self.pending_changed = threading.Condition()
+
+        self.rollover, self.rollover_cutoff = None, None
+        if keep_months is not None:
+            self.rollover_cutoff = Archives.cutoff(keep_months)
+            self.rollover = self.writer.submit(lambda conn: self.archives.rollover(keep_months), transaction = False)
+        self.day_cache = LruCache(TaskStore.CACHED_DAYS)
+        self.listeners = []
+        self.task_names = TaskNameIndex(self)
+        self.add_listener(self.task_names.on_store_changed)
+
+    """Call listener(change, tasks) after every committed write that changes tasks
+
+    "change" is "added", "finished" or "deleted" and "tasks" is a list of rows
+    (id, task, finished, date), as returned by get_tasks_by_date(), with the
+    values after the change (the last values for deleted tasks). Listeners are
+    called on the write queue thread, so a GUI must pass the change on to its
+    own thread (see UiChannel.py).
+    """
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def notify(self, change, tasks):
+        if tasks:
+            for listener in list(self.listeners):
+                listener(change, tasks)
+
+    """Commit pending writes and close the database connections"""
+
+    def close(self):
+        self.writer.close()
+        self.database.close()
+
+    """Add a new row entry into the logger database for a task that just started
+
+    The database consist of four values: task text, finished integer, date
+    text and day text. The finished integer defines if the task was finished
+    early (value = 0/False) or full 25 minutes duration was used (value = 1/True).
+    date text is started_time and day text is its date portion.
+
+    The returned Future holds the primary key of the new row once committed.
+    The task counts as a duplicate for task_is_duplicate() from this call on.
+
+    With unique = True, the task is only added if no task with the same name was
+    added on the same day, and otherwise the Future holds None. Names are
+    compared as by task_is_duplicate(), ignoring case and extra whitespace. The
+    check and the insert are one statement, so two callers can not add the same
+    task at once.
+    """
+
+    def add_new_task(self, task_name, started_time, unique = False):
+        day, date = started_time.date().isoformat(), started_time.isoformat(" ")
+        self.add_pending(day)
+        if unique:
+            add_task_sql = """INSERT INTO pomodoro (task, finished, date, day) SELECT ?, 0, ?, ?
+                              WHERE NOT EXISTS (SELECT 1 FROM pomodoro WHERE day = ? AND normalize_task_name(task) = ?)"""
+
+            def add_unique(conn):
+                cursor = conn.execute(add_task_sql, (task_name, date, day, day, normalize(task_name)))
+                return cursor.lastrowid if cursor.rowcount else None
+
+            future = self.writer.submit(add_unique)
+        else:
+            add_task_sql = "INSERT INTO pomodoro (task, finished, date, day) VALUES (?, 0, ?, ?)"
+            future = self.writer.submit(add_task_sql, (task_name, date, day))
+        self.task_names.add_pending(task_name, day)
+
+        def add_to_cache(tasks):
+            #the row may already be cached if the day was read right after the commit
+            if all(task[0] != future.result() for task in tasks):
+                tasks.append((future.result(), task_name, 0, date))
+                tasks.sort(key = lambda task: (task[3], task[0]))
+
+        def added(_):
+            try:
+                if future.exception() is None and future.result() is not None:
+                    self.day_cache.update(day, add_to_cache)
+                    self.notify("added", [(future.result(), task_name, 0, date)])
+            finally:
+                self.task_names.remove_pending(task_name, day)
+
+        future.add_done_callback(added)
+        future.add_done_callback(lambda _: self.remove_pending(day))
+        return future
+
+    """Update the database to reflect that the full 25 minutes duration was used for a task
+
+    The finished integer is set to 1 on the row added by add_new_task() with the
+    same task name and started_time. The update is submitted to the write queue
+    after the insert, so it always runs after the row exists. The returned
+    Future holds the number of tasks marked once committed.
+    """
+
+    def mark_finished_task(self, task_name, started_time):
+        finished_tasks_sql = "SELECT id, task, 1, date FROM pomodoro WHERE day = ? AND task = ? AND date = ? AND finished = 0"
+        add_task_sql = "UPDATE pomodoro SET finished = 1 WHERE day = ? AND task = ? AND date = ? AND finished = 0"
+        day, date = started_time.date().isoformat(), started_time.isoformat(" ")
+        finished = []
+        self.add_pending(day)
+
+        def mark_finished(conn):
+            finished[:] = conn.execute(finished_tasks_sql, (day, task_name, date)).fetchall()
+            return conn.execute(add_task_sql, (day, task_name, date)).rowcount
+
+        future = self.writer.submit(mark_finished)
+
+        def mark_in_cache(tasks):
+            for index, (task_id, name, _, task_date) in enumerate(tasks):
+                if name == task_name and task_date == date:
+                    tasks[index] = (task_id, name, 1, task_date)
+
+        def marked(_):
+            if future.exception() is None:
+                self.day_cache.update(day, mark_in_cache)
+                self.notify("finished", finished)
+
+        future.add_done_callback(marked)
+        future.add_done_callback(lambda _: self.remove_pending(day))
+        return future
+
+    """Submit sql query to delete a task started within a specific minute
+
+    task_date is formatted as "2020-12-20 20:46", so the task is looked up in the
+    time range from the start of that minute to the start of the next one. The
+    returned Future holds the number of tasks deleted once committed.
+    """
+
+    def delete_task(self, task_name, task_date):
+        deleted_tasks_sql = "SELECT id, task, finished, date FROM pomodoro WHERE day = ? AND task = ? AND date >= ? AND date < ?"
+        delete_task_sql = "DELETE FROM pomodoro WHERE day = ? AND task = ? AND date >= ? AND date < ?"
+        minute = datetime.datetime.strptime(task_date, "%Y-%m-%d %H:%M")
+        next_minute = minute + datetime.timedelta(minutes = 1)
+        day, first, last = minute.date().isoformat(), minute.isoformat(" "), next_minute.isoformat(" ")
+        deleted = []
+        self.add_pending(day)
+
+        def delete(conn):
+            deleted[:] = conn.execute(deleted_tasks_sql, (day, task_name, first, last)).fetchall()
+            return conn.execute(delete_task_sql, (day, task_name, first, last)).rowcount
+
+        future = self.writer.submit(delete)
+
+        def delete_from_cache(tasks):
+            tasks[:] = [task for task in tasks if not (task[1] == task_name and first <= task[3] < last)]
+
+        def deleted_task(_):
+            if future.exception() is None:
+                self.day_cache.update(day, delete_from_cache)
+                self.notify("deleted", deleted)
+
+        future.add_done_callback(deleted_task)
+        future.add_done_callback(lambda _: self.remove_pending(day))
+        return future
+
+    """Submit sql queries to delete tasks by primary key, all in one transaction
+
+    task_ids are the ids returned by get_tasks_by_date() and search_tasks(). Each
+    chunk of ids is one indexed lookup on the primary key, however many tasks
+    there are. The returned Future holds the rows (id, task, finished, date) of
+    every task deleted once committed.
+
+    Ids not found in the database are deleted from the archives whose range of
+    ids covers them. Those archives are attached first, so the deletes from the
+    database and from every archive are one transaction: either every task is
+    deleted or, on error, none is. The write runs on its own on the write queue,
+    as attaching is not allowed inside a transaction.
+    """
+
+    def delete_tasks(self, task_ids):
+        task_ids = list(task_ids)
+        chunks = [task_ids[start:start + TaskStore.DELETE_CHUNK_SIZE] for start in range(0, len(task_ids), TaskStore.DELETE_CHUNK_SIZE)]
+
+        def delete(conn):
+            found = set()
+            for chunk in chunks:
+                found.update(task_id for task_id, in conn.execute("SELECT id FROM pomodoro WHERE id IN (" + ", ".join("?" * len(chunk)) + ")", chunk))
+            archived_ids = [task_id for task_id in task_ids if task_id not in found]
+            self.archives.attach_for_delete(archived_ids)
+
+            deleted = []
+            with self.database.transaction() as conn:
+                for chunk in chunks:
+                    placeholders = ", ".join("?" * len(chunk))
+                    deleted += conn.execute("SELECT id, task, finished, date FROM pomodoro WHERE id IN (" + placeholders + ")", chunk).fetchall()
+                    conn.execute("DELETE FROM pomodoro WHERE id IN (" + placeholders + ")", chunk)
+                for start in range(0, len(archived_ids), TaskStore.DELETE_CHUNK_SIZE):
+                    deleted += self.archives.delete(conn, archived_ids[start:start + TaskStore.DELETE_CHUNK_SIZE])
+            return deleted
+
+        #the days of the tasks are only known once they are deleted
+        self.add_pending(None)
+        future = self.writer.submit(delete, transaction = False)
+
+        def delete_from_cache(_):
+            if future.exception() is not None:
+                return
+            deleted_by_day = {}
+            for task_id, _, _, date in future.result():
+                deleted_by_day.setdefault(date[:10], set()).add(task_id)
+            for day, day_ids in deleted_by_day.items():
+                def delete_from_day(tasks, day_ids = day_ids):
+                    tasks[:] = [task for task in tasks if task[0] not in day_ids]
+                self.day_cache.update(day, delete_from_day)
+            self.notify("deleted", future.result())
+
+        future.add_done_callback(delete_from_cache)
+        future.add_done_callback(lambda _: self.remove_pending(None))
+        return future
+
+    """Run sql query to get a list of unique days (for example: '2020-12-20') from database
+
+    Every day with tasks has one row in the daily_summary table, or in the
+    archived_summary table once archived, so the task log itself is not scanned.
+    """
+
+    def get_unique_dates(self):
+        dates_sql = "SELECT day FROM daily_summary UNION SELECT day FROM archived_summary ORDER BY day DESC"
+        dates = self.readQuery(dates_sql)
+        return dates
+
+    """Run sql query to get the statistics of every day, newest first
+
+    Rows are (day, started, finished): the number of tasks started on the day and
+    how many of them used the full 25 minutes. They are read from the daily_summary
+    table, which the database keeps up to date on every write, and from the
+    summaries of archived days.
+
+    A day is in both tables only if tasks of an archived month were imported
+    since it was archived, until they are moved to the archive too.
+    """
+
+    def get_daily_summary(self):
+        summary_sql = """SELECT day, sum(started), sum(finished) FROM (
+                             SELECT day, started, finished FROM daily_summary
+                             UNION ALL SELECT day, started, finished FROM archived_summary)
+                         GROUP BY day ORDER BY day DESC"""
+        return self.readQuery(summary_sql)
+
+    """Run sql query to get (days, started, finished) totals over every day"""
+
+    def get_summary_totals(self):
+        totals_sql = "SELECT count(*), coalesce(sum(started), 0), coalesce(sum(finished), 0) FROM daily_summary"
+        archived_totals_sql = "SELECT count(*), coalesce(sum(started), 0), coalesce(sum(finished), 0) FROM archived_summary"
+        totals, archived_totals = self.readQuery(totals_sql)[0], self.readQuery(archived_totals_sql)[0]
+        return tuple(total + archived for total, archived in zip(totals, archived_totals))
+
+    """Run sql query to get tasks performed on specific day, one page at a time
+
+    Rows are (id, task, finished, date) ordered by start time. "after" is the
+    (date, id) of the last row of the previous page and "limit" is the page size
+    (-1 returns every remaining row). Pages are read with a range lookup on the
+    index, so every page costs the same no matter how deep into the day it is.
+
+    Cached days are paged from memory, without waiting for anything: the cache
+    is updated by every write once committed. A day that is not cached is read
+    from the database once the writes pending on that day are done, and added
+    to the cache if read in full, unless a write was committed in the meantime.
+
+    Days of archived months are read from their archive, attached on first use,
+    together with any of their tasks imported into the database since. Days the
+    rollover may still move are read as they are and not cached until it is
+    done.
+    """
+
+    def get_tasks_by_date(self, date, after = None, limit = -1):
+        cached_tasks = self.day_cache.get(date)
+        if cached_tasks is not None:
+            if after is not None:
+                cached_tasks = [task for task in cached_tasks if (task[3], task[0]) > tuple(after)]
+            return cached_tasks[:limit] if limit >= 0 else list(cached_tasks)
+
+        self.wait_for_writes(date)
+        moving = self.rollover_pending(date)
+        generation = self.day_cache.generation
+
+        if after is None:
+            day_sql = "SELECT id, task, finished, date FROM {}.pomodoro WHERE day = ?"
+            data = (date,)
+        else:
+            day_sql = "SELECT id, task, finished, date FROM {}.pomodoro WHERE day = ? AND (date, id) > (?, ?)"
+            data = (date, after[0], after[1])
+
+        if self.archives.is_archived(date):
+            schema = self.archives.attach(date[:7])
+            tasks_sql = day_sql.format("main") + " UNION ALL " + day_sql.format(schema) + " ORDER BY date, id LIMIT ?"
+            data = data + data + (limit,)
+        else:
+            tasks_sql = day_sql.format("main") + " ORDER BY date, id LIMIT ?"
+            data = data + (limit,)
+        tasks = self.database.runQuery(tasks_sql, data, True)
+
+        whole_day = after is None and (limit < 0 or len(tasks) < limit)
+        if whole_day and not moving and len(tasks) <= TaskStore.MAX_CACHED_DAY_TASKS:
+            self.day_cache.put(date, list(tasks), generation)
+        return tasks
+
+    """Run sql query to find tasks by name across every day, best matches first
+
+    "text" is matched word by word against the task_search full-text index, each
+    word as a prefix, so results can be shown while the name is being typed:
+    "sam ta" finds "Sample Task 1".
+
+    Rows are (id, task, finished, date, rank, source), where a lower rank is a
+    better match. Only the SEARCH_LIMIT most recent matches are ranked, which
+    keeps a search over a very large history in the milliseconds even for a word
+    that appears in most tasks.
+
+    The database is searched first (source 0), then the archives from the newest
+    month back (source 1, 2, ...), each attached only once the results before it
+    have all been returned. Pages work as in get_tasks_by_date(), with "after"
+    holding the (source, rank, id) of the last row of the previous page.
+
+    The archives searched are those listed when the search runs, so while the
+    rollover is pending the tasks of the month being moved may be missed.
+    """
+
+    def search_tasks(self, text, after = None, limit = -1):
+        words = text.split()
+        if not words:
+            return []
+        #every word is quoted so characters like - or : are not read as FTS5 syntax
+        match = " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+        search_sql = """SELECT tasks.id, tasks.task, tasks.finished, tasks.date, matches.rank
+                        FROM (SELECT rowid, rank FROM {0}.task_search WHERE task_search MATCH ? ORDER BY rowid DESC LIMIT ?) AS matches
+                        JOIN {0}.pomodoro AS tasks ON tasks.id = matches.rowid
+                        WHERE ? IS NULL OR matches.rank > ? OR (matches.rank = ? AND matches.rowid < ?)
+                        ORDER BY matches.rank, matches.rowid DESC LIMIT ?"""
+        first_source, rank, task_id = after if after is not None else (0, None, None)
+
+        self.wait_for_writes()
+        sources = ["main"] + self.archives.newest_first()
+        tasks = []
+        for source in range(first_source, len(sources)):
+            if source > first_source:
+                rank, task_id = None, None
+            schema = sources[source] if source == 0 else self.archives.attach(sources[source])
+            page_limit = limit - len(tasks) if limit >= 0 else -1
+            page = self.database.runQuery(search_sql.format(schema), (match, TaskStore.SEARCH_LIMIT, rank, rank, rank, task_id, page_limit), True)
+            tasks += [task + (source,) for task in page]
+            if limit >= 0 and len(tasks) >= limit:
+                break
+        return tasks
+
+    """Check if a task with the same name was already performed on a day (today by default)
+
+    This app does not allow duplicate task name for a specific date. A unique name
+    for each task will ensure that the app only delete one task at a time.
+
+    Names are compared ignoring case and extra whitespace. The check is a lookup
+    in the task name index, which reads a day only the first time it is asked
+    about, so it is done in memory however often it is called.
+    """
+
+    def task_is_duplicate(self, task_name, day = None):
+        return self.task_names.contains(task_name, day or datetime.date.today())
+
+    """Return up to "limit" names of recent tasks that start with "prefix" and are not used today yet"""
+
+    def complete_task_name(self, prefix, limit = 10):
+        return self.task_names.complete(prefix, datetime.date.today(), limit)
+
+    """Run sql query to get the distinct names of the tasks since a day, most recently used first
+
+    Only the database is read, which holds the last KEEP_MONTHS months, so
+    "since" should not be further back than the first day of the oldest one.
+    """
+
+    def get_recent_task_names(self, since, limit = -1):
+        names_sql = "SELECT task FROM pomodoro WHERE day >= ? GROUP BY task ORDER BY max(date) DESC LIMIT ?"
+        return [name for name, in self.readQuery(names_sql, (since.isoformat(), limit))]
+
+    """Wait until the months older than KEEP_MONTHS have been archived, if the store archives them
+
+    The tasks of a month being moved are briefly in both the database and its
+    archive, or in neither as seen from the list of archived months. If the
+    rollover failed, the months stay in the database and are moved next time.
+    """
+
+    def wait_for_rollover(self):
+        if self.rollover is not None:
+            concurrent.futures.wait([self.rollover])
+
+    """Return True until the rollover is done, if it may move "day", or any day if day is None
+
+    Reads do not wait for the rollover, so a GUI reads again the days for which
+    this was True once it is done.
+    """
+
+    def rollover_pending(self, day = None):
+        if self.rollover is None or self.rollover.done():
+            return False
+        return day is None or day < self.rollover_cutoff
+
+    """Return the hit, miss and eviction counters of the day cache"""
+
+    def cache_stats(self):
+        return self.day_cache.stats()
+
+    """Run a read query once every task write submitted so far has been committed
+
+    Reads go straight to the database. Waiting for the pending task writes
+    first makes sure a read always sees the tasks added, finished or deleted
+    before it. Other writes on the write queue, such as the rollover, are not
+    waited for.
+    """
+
+    def readQuery(self, sql, data = None):
+        self.wait_for_writes()
+        return self.database.runQuery(sql, data, True)
+
+    """Count the task writes of a day (None: of any day) from their submit until their done callbacks have run"""
+
+    def add_pending(self, day):
+        with self.pending_changed:
+            self.pending_days[day] = self.pending_days.get(day, 0) + 1
+
+    def remove_pending(self, day):
+        with self.pending_changed:
+            self.pending_days[day] -= 1
+            if not self.pending_days[day]:
+                del self.pending_days[day]
+            self.pending_changed.notify_all()
+
+    """Return True while any task write is pending, until its listeners have been called"""
+
+    def has_pending_writes(self):
+        with self.pending_changed:
+            return bool(self.pending_days)
+
+    """Block until no task write is pending on "day", or on any day if day is None
+
+    Must not be called from the write queue thread, which runs the writes.
+    """
+
+    def wait_for_writes(self, day = None):
+        with self.pending_changed:
+            if day is None:
+                self.pending_changed.wait_for(lambda: not self.pending_days)
+            else:
+                self.pending_changed.wait_for(lambda: day not in self.pending_days and None not in self.pending_days)
@@ -0,0 +1,230 @@
+"""Timer Scheduler
+
+This script runs any number of count down timers from a single thread. Every
+timer is kept in a priority queue (heap) ordered by the time its displayed value
+next changes, so the thread only wakes up when a timer is actually due.
+
+Each timer behaves like a CountingThread: its listener must provide method
+implementation for finish() and update_time_remaining(), and the timer can be
+paused, resumed, finished early or force quit. The listener methods are called
+from the scheduler thread.
+
+Running this script directly benchmarks the scheduling jitter (how late a timer
+fires compared to its deadline) at 10, 1k and 50k concurrent timers.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+import datetime
+
+class ScheduledTimer():
+    """State of one count down timer. __slots__ keeps the memory per timer flat."""
+
+    __slots__ = ("listener", "end_time", "deadline", "paused", "pause_time",
+                 "end_now", "active", "last_time_string")
+
+    def __init__(self, listener, end_time):
+        self.listener = listener
+        self.end_time = end_time
+        self.deadline = None
+        self.paused = False
+        self.pause_time = None
+        self.end_now = False
+        self.active = True
+        self.last_time_string = None
+
+class TimerScheduler(threading.Thread):
+
+    def __init__(self, clock = time.monotonic):
+        super().__init__(daemon = True)
+        self.clock = clock
+
+        #heap entries are (deadline, sequence, timer). An entry is stale when the
+        #timer's deadline has changed since it was pushed, and is skipped when popped.
+        self.heap = []
+        self.sequence = itertools.count()
+        self.timers = set()
+
+        self.wakeup = threading.Condition()
+        self.closed = False
+
+        #set to a list to record how late (in seconds) each due timer was handled
+        self.lateness = None
+
+    """Add, pause, resume, finish and force quit timers
+
+    All methods are thread-safe. Each change pushes the timer's new deadline on
+    the heap and wakes the scheduler thread if that deadline is the earliest one.
+    """
+
+    def add_timer(self, listener, duration):
+        if isinstance(duration, datetime.timedelta):
+            duration = duration.total_seconds()
+        with self.wakeup:
+            timer = ScheduledTimer(listener, self.clock() + duration)
+            self.timers.add(timer)
+            self._schedule(timer, self.clock())
+            return timer
+
+    def pause(self, timer):
+        with self.wakeup:
+            if timer.active and not timer.paused:
+                timer.paused = True
+                timer.pause_time = self.clock()
+                timer.deadline = None
+
+    def resume(self, timer):
+        """Shift end time by the whole time spent paused, fractions of a second included, as CountingThread does"""
+
+        with self.wakeup:
+            if timer.active and timer.paused:
+                now = self.clock()
+                timer.end_time += now - timer.pause_time
+                timer.paused = False
+                self._schedule(timer, now)
+
+    def finish_now(self, timer):
+        with self.wakeup:
+            if timer.active:
+                timer.end_now = True
+                self._schedule(timer, self.clock())
+
+    def stop(self, timer):
+        """Force quit a timer. Its listener's finish() is not called."""
+
+        with self.wakeup:
+            timer.active = False
+            timer.deadline = None
+            self.timers.discard(timer)
+
+    def shutdown(self):
+        with self.wakeup:
+            self.closed = True
+            self.wakeup.notify()
+
+    def _schedule(self, timer, now):
+        """Push the time at which the timer's displayed value next changes"""
+
+        if timer.end_now:
+            deadline = now
+        else:
+            remaining = timer.end_time - now
+            #the display shows whole seconds, so it changes when remaining drops below floor(remaining)
+            deadline = timer.end_time - math.floor(remaining) + 0.001 if remaining > 0 else now
+        timer.deadline = deadline
+        heapq.heappush(self.heap, (deadline, next(self.sequence), timer))
+        if self.heap[0][2] is timer:
+            self.wakeup.notify()
+
+    """Continously wait for the earliest deadline and handle every timer that is due
+
+    Listener methods are called after the lock is released so listeners can
+    pause, resume or stop timers from inside their callbacks.
+    """
+
+    def run(self):
+        while True:
+            with self.wakeup:
+                while not self.closed:
+                    if not self.heap:
+                        self.wakeup.wait()
+                        continue
+                    delay = self.heap[0][0] - self.clock()
+                    if delay <= 0:
+                        break
+                    self.wakeup.wait(delay)
+                if self.closed:
+                    return
+
+                now = self.clock()
+                updates = []
+                finished = []
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, _, timer = heapq.heappop(self.heap)
+                    if timer.deadline != deadline:
+                        continue
+                    if self.lateness is not None:
+                        self.lateness.append(now - deadline)
+
+                    if timer.end_now or now >= timer.end_time:
+                        timer.active = False
+                        timer.deadline = None
+                        self.timers.discard(timer)
+                        finished.append(timer)
+                        continue
+
+                    mins, secs = divmod(int(timer.end_time - now), 60)
+                    time_string = "{:02d}:{:02d}".format(mins, secs)
+                    if time_string != timer.last_time_string:
+                        timer.last_time_string = time_string
+                        updates.append((timer, time_string))
+                    self._schedule(timer, now)
+
+            for timer, time_string in updates:
+                timer.listener.update_time_remaining(time_string)
+            for timer in finished:
+                timer.listener.finish()
+
+"""Benchmark scheduling jitter and memory per timer at increasing timer counts"""
+
+class _BenchmarkListener():
+    __slots__ = ("finished",)
+
+    def __init__(self):
+        self.finished = False
+
+    def update_time_remaining(self, time_string):
+        pass
+
+    def finish(self):
+        self.finished = True
+
+def benchmark(timer_count, run_seconds = 3):
+    import random
+    import tracemalloc
+
+    rng = random.Random(timer_count)
+
+    #memory is measured on a throwaway scheduler since tracing slows down add_timer()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scheduler = TimerScheduler()
+    for _ in range(timer_count):
+        scheduler.add_timer(_BenchmarkListener(), run_seconds)
+    memory_per_timer = (tracemalloc.get_traced_memory()[0] - before) / timer_count
+    tracemalloc.stop()
+
+    scheduler = TimerScheduler()
+    scheduler.lateness = []
+    listeners = [_BenchmarkListener() for _ in range(timer_count)]
+    for listener in listeners:
+        scheduler.add_timer(listener, rng.uniform(1, run_seconds))
+
+    cpu_start = time.process_time()
+    scheduler.start()
+    time.sleep(run_seconds + 0.5)
+    cpu_used = time.process_time() - cpu_start
+    scheduler.shutdown()
+    scheduler.join()
+
+    lateness = sorted(scheduler.lateness)
+    def percentile(p):
+        return lateness[min(len(lateness) - 1, int(len(lateness) * p))] * 1000
+
+    return {
+        "timers": timer_count,
+        "finished": sum(listener.finished for listener in listeners),
+        "wakeups": len(lateness),
+        "jitter_ms_p50": round(percentile(0.50), 3),
+        "jitter_ms_p99": round(percentile(0.99), 3),
+        "jitter_ms_max": round(lateness[-1] * 1000, 3),
+        "bytes_per_timer": round(memory_per_timer),
+        "cpu_seconds": round(cpu_used, 3),
+    }
+
+if __name__ == "__main__":
+    for timer_count in (10, 1000, 50000):
+        print(benchmark(timer_count))
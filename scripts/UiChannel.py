@@ -0,0 +1,111 @@
+"""UI Channel
+
+This script passes GUI updates from worker threads (such as CountingThread) to
+the tkinter main thread. tkinter widgets and variables must only be used from
+the thread running mainloop(), so worker threads post a callback on a queue and
+the main thread drains the queue every interval_ms with after().
+
+Worker threads only put updates on the queue; every tkinter call, scheduling
+included, is made on the main thread. The queue is only polled while there is
+something that may post: the main thread calls poll_while() with a condition
+when it starts such work (a countdown, a database write) and polling stops
+once every condition is false and the queue has been drained, so an idle app
+is not woken up.
+
+Updates posted with the same key are coalesced: if a key is posted several times
+between two drains, only the latest one is applied, so there is at most one
+redraw per displayed value.
+
+The delay between each post and the redraw that follows it is recorded in
+Metrics ("ui_channel_latency_seconds") while instrumentation is enabled.
+"""
+
+import queue
+import time
+import Metrics
+
+class UiChannel():
+
+    def __init__(self, widget, interval_ms = 50):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.queue = queue.SimpleQueue()
+        self.after_id = None
+        self.stopped = False
+
+        #conditions polled for, see poll_while()
+        self.conditions = []
+
+    """Queue callback(*args) to run on the main thread. Safe to call from any thread.
+
+    "key" names the value being updated (for example: "time_remaining"). A
+    queued update is dropped if a newer one with the same key is posted before
+    the queue is drained. Updates with key None are never dropped.
+
+    The update is applied on the next drain, so the work posting it must be
+    covered by poll_while().
+    """
+
+    def post(self, key, callback, *args):
+        self.queue.put((key, callback, args, time.perf_counter()))
+
+    """Drain the queue every interval_ms for as long as condition() is true. Main thread only.
+
+    condition() must only become false once the work it stands for can no
+    longer post, for example "the CountingThread is alive": it is checked before
+    the queue is drained, so the updates posted until then are still applied.
+    """
+
+    def poll_while(self, condition):
+        self.conditions.append(condition)
+        if self.after_id is None and not self.stopped:
+            self.after_id = self.widget.after(self.interval_ms, self.drain)
+
+    """Drain once, to apply anything posted before the main loop runs. Main thread only."""
+
+    def start(self):
+        if self.after_id is None:
+            self.after_id = self.widget.after(self.interval_ms, self.drain)
+
+    def stop(self):
+        self.stopped = True
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    """Run every queued update in order, skipping those replaced by a newer post
+
+    The next drain is scheduled if any condition was still true before the
+    queue was read. After the updates are applied, an idle callback records when
+    the redraw they triggered has been done.
+    """
+
+    def drain(self):
+        self.after_id = None
+        self.conditions = [condition for condition in self.conditions if condition()]
+
+        updates = []
+        while True:
+            try:
+                updates.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if updates:
+            latest = {key: index for index, (key, _, _, _) in enumerate(updates) if key is not None}
+            for index, (key, callback, args, posted_at) in enumerate(updates):
+                if key is None or latest[key] == index:
+                    callback(*args)
+            if Metrics.enabled:
+                self.widget.after_idle(self.record_latency, [posted_at for _, _, _, posted_at in updates])
+
+        if self.conditions and not self.stopped:
+            self.after_id = self.widget.after(self.interval_ms, self.drain)
+
+    """Record the post-to-redraw delay of every update drained, coalesced ones included"""
+
+    @staticmethod
+    def record_latency(posted_times):
+        now = time.perf_counter()
+        for posted_at in posted_times:
+            Metrics.observe("ui_channel_latency_seconds", now - posted_at)
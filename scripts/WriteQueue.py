@@ -0,0 +1,139 @@
+"""Write Queue
+
+This script creates a seperate thread that performs database writes in the
+background, so a slow disk or a locked database never freezes the GUI.
+
+Writes are put on a bounded queue and return a concurrent.futures.Future right
+away. The thread takes every write waiting on the queue (up to max_batch) and
+runs them in a single transaction. When the queue is full, submit() blocks until
+the thread catches up, which caps the number of pending writes at max_pending.
+
+The deepest the queue got and the longest time a batch took are kept, and the
+time of every batch is recorded in Metrics while instrumentation is enabled.
+"""
+
+import threading
+import queue
+import time
+import Metrics
+from concurrent.futures import Future
+
+class WriteQueue(threading.Thread):
+
+    def __init__(self, database, max_pending = 1000, max_batch = 500):
+        super().__init__(daemon = True)
+        self.database = database
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize = max_pending)
+
+        #queue depth and flush time measurements
+        self.max_depth = 0
+        self.last_flush_seconds = 0
+        self.max_flush_seconds = 0
+
+    """Add a write to the queue and return a Future for its result
+
+    "sql" is either a sql statement, run with the values in "data", or a function
+    that takes the sqlite3 connection. The Future result is the primary key of the
+    inserted row for INSERT statements, the number of rows changed for other sql
+    statements, or the return value of the function.
+
+    With transaction = False, "sql" must be a function. It runs on its own,
+    between the batches before and after it, outside of any transaction, so it
+    can attach databases and group its writes with Database.transaction().
+    """
+
+    def submit(self, sql, data = None, transaction = True):
+        future = Future()
+        self.queue.put((sql, data, future, transaction))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return future
+
+    """Block until every write submitted so far has been committed"""
+
+    def flush(self):
+        self.queue.join()
+
+    """Commit pending writes and stop the thread"""
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = []
+            for write in batch:
+                if write is not None and write[3]:
+                    writes.append(write[:3])
+                    continue
+                if writes:
+                    self.write_batch(writes)
+                    writes = []
+                if write is not None:
+                    self.write_alone(*write[:3])
+            if writes:
+                self.write_batch(writes)
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    """Run a write submitted with transaction = False, outside of any transaction"""
+
+    def write_alone(self, function, data, future):
+        try:
+            result = function(self.database.connection())
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    """Run a batch of writes in one transaction
+
+    Each write runs inside its own savepoint, so a failed write only fails its
+    own Future and the changes it made before failing are rolled back, not
+    committed with the rest of the batch. If the commit itself fails, every
+    write of the batch fails.
+    """
+
+    def write_batch(self, writes):
+        flush_start = time.perf_counter()
+        results = []
+        try:
+            with self.database.transaction() as conn:
+                for sql, data, future in writes:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        if callable(sql):
+                            result = sql(conn)
+                        else:
+                            cursor = conn.execute(sql, data or ())
+                            is_insert = sql.lstrip().upper().startswith("INSERT")
+                            result = cursor.lastrowid if is_insert else cursor.rowcount
+                    except Exception as error:
+                        conn.execute("ROLLBACK TO write")
+                        results.append((future, None, error))
+                    else:
+                        results.append((future, result, None))
+                    conn.execute("RELEASE write")
+        except Exception as error:
+            results = [(future, None, error) for _, _, future in writes]
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        self.last_flush_seconds = time.perf_counter() - flush_start
+        self.max_flush_seconds = max(self.max_flush_seconds, self.last_flush_seconds)
+        if Metrics.enabled:
+            Metrics.observe("write_queue_flush_seconds", self.last_flush_seconds)